@@ -0,0 +1,61 @@
+"""Compare size and load time of plain and compressed csv databases.
+
+Creates a synthetic database of hourly prices and consumption for several
+years, saves it as plain csv, gzip and xz compressed csv, and loads each
+file back a few times.
+
+Usage (in src directory):
+
+    python3 -m benchmarks.compression --years 5
+"""
+
+import argparse
+from functools import partial
+import os
+import tempfile
+import time
+import numpy as np
+from repositories import ColumnarDatabase
+from services import DataService
+
+
+def create_dataservice(years):
+    """Create a DataService with synthetic hourly data."""
+    hours = years * 8760
+    times = 1577836800 + 3600 * np.arange(hours, dtype=np.int64)
+    rng = np.random.default_rng(0)
+    prices = np.round(rng.gamma(2.0, 0.05, hours), 4)
+    amounts = np.round(rng.gamma(1.5, 0.4, hours), 4)
+    return DataService(database=ColumnarDatabase.from_arrays(times, prices, amounts))
+
+
+def measure(function, repeat):
+    """Return the best wall-clock time of `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    dataservice = create_dataservice(args.years)
+    print(f"{args.years} years, {args.years * 8760} rows")
+    print(f"{'file':<12}{'size (kB)':>12}{'save (s)':>12}{'load (s)':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for filename in ("db.csv", "db.csv.gz", "db.csv.xz"):
+            dbfile = os.path.join(tmpdir, filename)
+            save = measure(partial(dataservice.save_db, dbfile), 1)
+            target = DataService(engine="columnar")
+            load = measure(partial(target.load_db, dbfile), args.repeat)
+            size = os.path.getsize(dbfile) / 1024
+            print(f"{filename:<12}{size:>12.0f}{save:>12.3f}{load:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
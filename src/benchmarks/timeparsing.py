@@ -0,0 +1,62 @@
+"""Compare throughput of time stamp parsing with dateutil.
+
+Parses time stamps in the formats of spot-hinta.fi, datahub and the csv
+database with `entities.timeparsing.parse_time` and `dateutil.parser.parse`.
+Unique strings measure the parsers, repeated strings also the cache.
+
+Usage (in src directory):
+
+    python3 -m benchmarks.timeparsing --count 100000
+"""
+
+import argparse
+import datetime
+import time
+import dateutil.parser
+from entities.timeparsing import parse_time, _parse_fast, _parse_fixed
+
+FORMATS = {
+    "spot-hinta.fi": "%Y-%m-%dT%H:%M:%S+02:00",
+    "datahub": "%Y-%m-%dT%H:%M:%S.000Z",
+    "database": "%Y-%m-%dT%H:%M:%S+00:00",
+    "user input": "%Y-%m-%d %H:%M",
+}
+
+
+def create_texts(layout, count):
+    """Return `count` hourly time stamps formatted with `layout`."""
+    start = datetime.datetime(2020, 1, 1)
+    hour = datetime.timedelta(hours=1)
+    return [(start + i * hour).strftime(layout) for i in range(count)]
+
+
+def measure(function, texts):
+    """Return parsed time stamps per second."""
+    start = time.perf_counter()
+    for text in texts:
+        function(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+    parsers = {
+        "dateutil": dateutil.parser.parse,
+        "fixed layout": _parse_fixed,
+        "parse_time": parse_time,
+    }
+    print(f"{'format':<16}{'parser':<16}{'unique /s':>14}{'repeated /s':>14}")
+    for name, layout in FORMATS.items():
+        texts = create_texts(layout, args.count)
+        repeated = texts[:48] * (args.count // 48)
+        for parser_name, function in parsers.items():
+            _parse_fast.cache_clear()
+            unique = measure(function, texts)
+            cached = measure(function, repeated)
+            print(f"{name:<16}{parser_name:<16}{unique:>14,.0f}{cached:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,10 +20,25 @@ def _getenv(env_name, default, prefix="SAEHAEKKAE"):
 
 
 DB_FILE = _getenv("DB_FILE", "db.csv")
+DB_ENGINE = _getenv("DB_ENGINE", "records")
+DB_JOURNAL_LIMIT = int(_getenv("DB_JOURNAL_LIMIT", 0))
 ENERGY_PRICE_SOURCE = _getenv("ENERGY_PRICE_SOURCE", "spot-hinta.fi")
+# bidding areas to update, and the area of prices in user interfaces
+PRICE_AREAS = _getenv("PRICE_AREAS", "FI").split(",")
+PRICE_AREA = _getenv("PRICE_AREA", None)
+# local time when the prices of the next day are available from the source
+PRICE_PUBLICATION_TIME = _getenv("PRICE_PUBLICATION_TIME", "14:00")
+# deadlines of updating sources in seconds, sources are updated concurrently
+UPDATE_TIMEOUT = float(_getenv("UPDATE_TIMEOUT", 60))
+PRICE_UPDATE_TIMEOUT = float(_getenv("PRICE_UPDATE_TIMEOUT", 10))
 ENERGY_CONSUMPTION_SOURCE = _getenv("ENERGY_CONSUMPTION_SOURCE", "json")
 ENERGY_CONSUMPTION_FILE = _getenv("ENERGY_CONSUMPTION_FILE", "data/generic-data.json")
 
+# cache of responses of price sources, responses younger than the
+# time-to-live (seconds) are used without fetching them again
+HTTP_CACHE_DIR = _getenv("HTTP_CACHE_DIR", os.path.join(root_dir, ".cache"))
+HTTP_CACHE_TTL = float(_getenv("HTTP_CACHE_TTL", 3600))
+
 # Google settings, these are needed to make google calendar working!
 GOOGLE_CREDENTIALS_FILE = _getenv("GOOGLE_CREDENTIALS_FILE", "google_credentials.json")
 GOOGLE_CALENDAR_ID = _getenv("GOOGLE_CALENDAR_ID", None)
@@ -1,4 +1,6 @@
 from .record import Record
 from .selection import Selection
+from .httpcache import HttpCache
+from .daemon import run_in_daemon
 from .sources import PriceSource, ConsumptionSource, GenericSource
 from .messages import ShellyMessage, GoogleMessage
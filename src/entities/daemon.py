@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import Future
+
+
+def run_in_daemon(function, *args, name=None):
+    """Run a function in a new daemon thread.
+
+    Threads of a ThreadPoolExecutor are joined when the interpreter exits, so
+    a hung network request would keep the process running. A daemon thread is
+    simply abandoned.
+
+    Args:
+        function: function to call
+        *args: arguments of the function
+        name (str, optional): name of the thread
+
+    Returns:
+        A concurrent.futures.Future of the return value.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except Exception as err:  # pylint: disable=broad-except
+            future.set_exception(err)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
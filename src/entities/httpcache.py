@@ -0,0 +1,161 @@
+"""Pooled HTTP session with an on-disk response cache.
+
+Sources fetching data from the internet share one `requests.Session`, so
+connections are reused. Responses can be kept in a cache directory, one file
+per URL. A cached response younger than the time-to-live is returned without
+any network round-trip. An older one is revalidated with a conditional
+request (`If-None-Match` / `If-Modified-Since`), and if the server answers
+304 Not Modified, the cached body is used and its age is reset.
+
+Typical usage example:
+
+    >>> cache = HttpCache(".cache", ttl=3600)
+    >>> response = cache.get("https://api.spot-hinta.fi/TodayAndDayForward")
+    >>> response.json()
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from warnings import warn
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _SharedSession:
+    """Holder of the shared session, created lazily by `get_session`."""
+
+    session = None
+    lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared pooled HTTP session, created on the first call."""
+    with _SharedSession.lock:
+        if _SharedSession.session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SharedSession.session = session
+        return _SharedSession.session
+
+
+class CachedResponse:
+    """Response returned by `HttpCache.get`.
+
+    Attributes:
+        status_code (int): HTTP status code, 200 also for revalidated and
+            cached responses
+        content (bytes): body of the response
+        from_cache (bool): whether the body came from the cache
+    """
+
+    def __init__(self, status_code, content, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+    def json(self):
+        """Return body decoded as JSON."""
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """HTTP client with a local response cache keyed by URL."""
+
+    def __init__(self, directory=None, ttl=3600, session=None):
+        """Construct a new HttpCache object.
+
+        Args:
+            directory (str, optional): cache directory, created when needed.
+                If not given, nothing is cached and only the pooled session
+                is used.
+            ttl (float, optional): time-to-live of cached responses in
+                seconds, older responses are revalidated
+            session (optional): requests session, by default the shared
+                session from `get_session`
+
+        Returns:
+            A new HttpCache object.
+        """
+        self._directory = directory
+        self._ttl = ttl
+        self._session = session or get_session()
+
+    def _get_filename(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, f"{key}.json")
+
+    def _read(self, url):
+        """Return cache entry of a URL, or None."""
+        if self._directory is None:
+            return None
+        try:
+            with open(self._get_filename(url), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def _write(self, url, entry):
+        """Store cache entry of a URL, atomically."""
+        if self._directory is None:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        filename = self._get_filename(url)
+        tmpfile = f"{filename}.{threading.get_ident()}.tmp"
+        with open(tmpfile, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(tmpfile, filename)
+
+    def get(self, url, params=None, timeout=10):
+        """Fetch a URL, from the cache if possible.
+
+        Args:
+            url (str): URL to fetch
+            params (dict, optional): query parameters
+            timeout (float, optional): timeout of the request in seconds
+
+        Returns:
+            CachedResponse
+
+        Notes:
+            Only successful responses are cached. If the request fails and
+            there is a cached response, the stale response is returned with a
+            warning.
+        """
+        url = requests.Request("GET", url, params=params).prepare().url
+        entry = self._read(url)
+        if entry is not None and time.time() - entry["time"] < self._ttl:
+            return CachedResponse(200, entry["body"].encode("utf-8"), True)
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self._session.get(url, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException as err:
+            if entry is None:
+                raise
+            warn(f"Unable to fetch {url}, using cached response: {err}")
+            return CachedResponse(200, entry["body"].encode("utf-8"), True)
+        if response.status_code == 304 and entry is not None:
+            entry["time"] = time.time()
+            self._write(url, entry)
+            return CachedResponse(200, entry["body"].encode("utf-8"), True)
+        if response.status_code == 200:
+            self._write(
+                url,
+                {
+                    "url": url,
+                    "time": time.time(),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "body": response.content.decode("utf-8"),
+                },
+            )
+        return CachedResponse(response.status_code, response.content)
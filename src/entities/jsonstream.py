@@ -0,0 +1,97 @@
+"""Streaming reader of JSON arrays and newline-delimited JSON.
+
+`json.load` decodes the whole document at once, so a large array of rows is
+in memory twice, as text and as Python objects, before the first row can be
+used. `iter_json` reads the file in fixed-size chunks and yields the
+elements of a top-level array one by one, so memory use depends on the size
+of one element, not on the size of the file. Files not starting with '[' are
+read as newline-delimited JSON (one value per line).
+
+Typical usage example:
+
+    >>> with open("data/generic-data.json", encoding="utf-8") as file:
+    ...     for row in iter_json(file):
+    ...         print(row["time"])
+"""
+
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """Buffer of a text file, holding at most one value and one chunk."""
+
+    def __init__(self, file, chunk_size):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self._eof = False
+
+    def _read(self):
+        """Read next chunk, dropping decoded text. Return False at the end."""
+        chunk = self._file.read(self._chunk_size)
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        self._eof = not chunk
+        return not self._eof
+
+    def peek(self):
+        """Skip whitespace and return next character, or '' at the end."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def decode(self):
+        """Decode next value, reading more text until the value is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may continue in next chunk
+                if end < len(self.buffer) or self._eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read()
+
+
+def iter_json(file, chunk_size=65536):
+    """Yield elements of a JSON array or values of newline-delimited JSON.
+
+    Args:
+        file: file opened in text mode
+        chunk_size (int, optional): number of characters read at once
+
+    Raises:
+        json.JSONDecodeError, if the file is not valid.
+
+    Returns:
+        A generator of decoded values.
+    """
+    reader = _Reader(file, chunk_size)
+    if reader.peek() != "[":
+        while reader.peek():
+            yield reader.decode()
+        return
+    reader.pos += 1
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode()
+        char = reader.peek()
+        if char not in (",", "]"):
+            raise json.JSONDecodeError(
+                "Expecting ',' delimiter", reader.buffer, reader.pos
+            )
+        reader.pos += 1
+        if char == "]":
+            return
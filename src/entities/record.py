@@ -1,8 +1,11 @@
 from datetime import datetime
 import json
 import math
+import numbers
 from dateutil.tz import tzutc
-from dateutil import parser
+from entities.timeparsing import parse_time
+
+_UTC = tzutc()
 
 
 class Record:
@@ -12,12 +15,17 @@ class Record:
     energy usage in kWh. When updating energy prices and/or consumption, very
     likely scenario is that one of those is unknown. This record gives some
     flexibility so that it supports missing values as well as updating values
-    later on. Internally, record stores time as a datetime object, but
-    constructor also supports unix timestamps and different kind of string
-    formats which are passed to `dateutil.parser`, like ISO 8601 format.
+    later on. Internally, record stores time as an integer unix time stamp,
+    and the datetime object is created only when it's asked, but constructor
+    also supports datetimes and different kind of string formats which are
+    parsed with `entities.timeparsing.parse_time`, like ISO 8601 format.
 
     Timestamp is timezone-aware. If no timezone is given, it's expected to be
-    UTC.
+    UTC. Time is stored with a precision of one second.
+
+    Records are created in large numbers, so the class uses `__slots__` to
+    keep them small. If time is already known to be a unix time stamp, use
+    `Record.from_epoch`, which skips all conversions.
 
     Typical usage example:
 
@@ -28,11 +36,13 @@ class Record:
         >>> record.to_json()
 
     Attributes:
-        time: Time of the energy price as Python datetime object
+        time: Time of the energy price as unix time stamp
         price: The price of the energy at the time as float
         amount: The amount of energy used at the time as float
     """
 
+    __slots__ = ("_epoch", "_time", "_price", "_amount")
+
     def __init__(self, time, price=float("nan"), amount=float("nan")):
         """Constructor of Record.
 
@@ -45,44 +55,82 @@ class Record:
             A new Record object
 
         Notes:
-            Time can also be given as integer (unix timestamp) or any string what dateutil.parser
-            understand, and it will be converted to datetime. Datetime without time zone will be
+            Time can also be given as integer (unix timestamp) or any string what parse_time
+            understands, and it will be converted to datetime. Datetime without time zone will be
             made timezone-aware by assuming utc.
         """
-        if isinstance(time, int):
-            self._time = datetime.utcfromtimestamp(time)
-        elif isinstance(time, str):
-            self._time = parser.parse(time)
+        if isinstance(time, numbers.Integral):
+            self._epoch = int(time)
         else:
+            if isinstance(time, str):
+                time = parse_time(time)
             assert isinstance(time, datetime)
-            self._time = time
-        if not self._time.tzinfo:
-            self._time = self._time.replace(tzinfo=tzutc())
-        self._time = self._time.astimezone(tzutc())
+            if not time.tzinfo:
+                time = time.replace(tzinfo=_UTC)
+            self._epoch = int(time.timestamp())
+        self._time = None
         self._price = float(price)
         self._amount = float(amount)
 
+    @classmethod
+    def from_epoch(cls, epoch, price=float("nan"), amount=float("nan")):
+        """Create a record without any conversions.
+
+        Args:
+            epoch (int): unix time stamp
+            price (float): energy price (EUR)
+            amount (float): the amount of energy (kWh)
+
+        Returns:
+            A new Record object
+
+        Notes:
+            Arguments are trusted to be of the right types, e.g. values read
+            from a database.
+        """
+        record = cls.__new__(cls)
+        record._epoch = epoch
+        record._time = None
+        record._price = price
+        record._amount = amount
+        return record
+
     def __eq__(self, other):
         """Overrides the default implementation"""
         if isinstance(other, Record):
             return (
-                (self._time == other._time)
+                (self._epoch == other._epoch)
                 and (self._price == other._price)
                 and (self._amount == other._amount)
             )
         return False
 
-    def get_time(self, utc=False):
+    def get_epoch(self):
+        """Get time of record as unix time stamp.
+
+        Args:
+            Nothing.
+
+        Returns:
+            integer
+        """
+        return self._epoch
+
+    def get_time(self, utc=False):  # pylint: disable=unused-argument
         """Get time of record.
 
         Args:
-            utc: bool, convert time to UTC time
+            utc (bool, optional): accepted for compatibility, time is always
+                returned in UTC
 
         Returns:
             Python datetime object.
+
+        Notes:
+            Time is always in UTC, datetime is created on the first call.
         """
-        if utc:
-            return self._time.astimezone(tzutc())
+        if self._time is None:
+            self._time = datetime.fromtimestamp(self._epoch, _UTC)
         return self._time
 
     def get_price(self):
@@ -133,20 +181,20 @@ class Record:
         """Update record.
 
         Args:
-            price (float): optional
-            amount (float): optional
+            price (float): optional, None keeps the old price
+            amount (float): optional, None keeps the old amount
 
         Returns:
             Boolean tuple (price_updated, amount_updated)
         """
         price_updated = False
         amount_updated = False
-        if price:
+        if price is not None:
             price = float(price)
             price_updated = self._price != price
             if price_updated:
                 self._price = price
-        if amount:
+        if amount is not None:
             amount = float(amount)
             amount_updated = self._amount != amount
             if amount_updated:
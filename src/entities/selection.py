@@ -1,6 +1,6 @@
 import datetime
 from collections import OrderedDict, namedtuple
-import dateutil.parser
+from entities.timeparsing import parse_time
 
 
 class Selection:
@@ -39,7 +39,7 @@ class Selection:
 
     def __getitem__(self, time):
         if isinstance(time, str):
-            time = dateutil.parser.parse(time).astimezone()
+            time = parse_time(time).astimezone()
         return self._timeranges[time]
 
     def __iter__(self):
@@ -66,7 +66,7 @@ class Selection:
             True if time is inside, false otherwise.
         """
         if isinstance(time, str):
-            time = dateutil.parser.parse(time).astimezone()
+            time = parse_time(time).astimezone()
         for timerange in self._timeranges.values():
             if timerange.start <= time < timerange.end:
                 return True
@@ -83,9 +83,9 @@ class Selection:
             Nothing.
         """
         if isinstance(start, str):
-            start = dateutil.parser.parse(start).astimezone()
+            start = parse_time(start).astimezone()
         if isinstance(end, str):
-            end = dateutil.parser.parse(end).astimezone()
+            end = parse_time(end).astimezone()
         assert isinstance(start, datetime.datetime)
         assert isinstance(end, datetime.datetime)
         self._timeranges[start] = Selection.TimeRange(start, end)
@@ -94,21 +94,17 @@ class Selection:
         """'Pack' timeranges by combining adjacent time ranges.
 
         As a result of packing, time ranges e.g. 13-14 and 14-15 are merged such
-        that there is only one timerange between 13-15.
+        that there is only one timerange between 13-15. Time ranges are sorted
+        once and merged in one pass, so packing e.g. 96 quarters of a day is
+        cheap.
         """
-        done = False
-        trs = self._timeranges = OrderedDict(sorted(self._timeranges.items()))
-        while not done:
-            done = True
-            keys = list(self._timeranges.keys())
-            for i in range(len(keys) - 1):
-                tri = trs[keys[i]]
-                trj = trs[keys[i + 1]]
-                if tri.end == trj.start:
-                    del trs[trj.start]
-                    trs[tri.start] = Selection.TimeRange(tri.start, trj.end)
-                    done = False
-                    break
+        packed = []
+        for timerange in sorted(self._timeranges.values()):
+            if packed and packed[-1].end == timerange.start:
+                packed[-1] = Selection.TimeRange(packed[-1].start, timerange.end)
+            else:
+                packed.append(timerange)
+        self._timeranges = OrderedDict((tr.start, tr) for tr in packed)
         return self
 
     def get_timeranges(self, pack=True):
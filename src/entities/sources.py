@@ -1,10 +1,14 @@
-import os
-import csv
+import hashlib
+import io
+import itertools
 import json
+import math
+import os
 from warnings import warn
-import requests
-import dateutil.parser
-from entities import Record
+import pandas as pd
+from .httpcache import HttpCache
+from .daemon import run_in_daemon
+from .jsonstream import iter_json
 
 
 class AbstractSource:
@@ -16,86 +20,256 @@ class AbstractSource:
 
 
 class PriceSource(AbstractSource):
-    """Update price data from spot-hinta.fi"""
+    """Update price data from spot-hinta.fi
+
+    Prices of several bidding areas (e.g. 'FI', 'SE3', 'EE') can be updated
+    at once. Areas are fetched concurrently, each in its own daemon thread,
+    and stored when all of them are done. Prices of other than the default area
+    of the database need a database supporting areas, e.g. ColumnarDatabase.
+    """
 
     url = "https://api.spot-hinta.fi/TodayAndDayForward"
 
-    def __init__(self, database, data=None):
+    def __init__(self, database, data=None, areas=None, cache=None):
+        """Construct a new PriceSource object.
+
+        Args:
+            database: database to update
+            data (optional): rows to use instead of fetching them, a list for
+                the default area or a dictionary from area to a list
+            areas (list, optional): bidding areas to update, by default only
+                the default area of the database
+            cache (HttpCache, optional): HTTP client with a response cache,
+                by default responses are not cached but the pooled session is
+                used
+
+        Returns:
+            A new PriceSource object.
+        """
         self._rows = data
         self._db = database
+        self._cache = cache or HttpCache()
+        self._areas = list(areas) if areas else [database.default_area]
+        if not database.supports_areas:
+            for area in self._areas:
+                if area != database.default_area:
+                    warn(f"database doesn't support areas, skipping area {area}")
+            self._areas = [database.default_area]
         self.price_updated = 0
         self.consumption_updated = 0
 
-    def get_rows(self):
-        if self._rows:
+    def get_rows(self, area=None):
+        """Return price rows of a bidding area, by default the default area."""
+        area = area or self._db.default_area
+        if isinstance(self._rows, dict):
+            return self._rows.get(area, [])
+        if self._rows and area == self._db.default_area:
             return self._rows
-        response = requests.get(PriceSource.url, timeout=10)
+        params = None if area == self._db.default_area else {"region": area}
+        response = self._cache.get(PriceSource.url, params=params)
         if response.status_code != 200:
-            warn("Unable to fetch prices from {url}: code {response.status_code}")
-            return (self.price_updated, self.consumption_updated)
+            warn(f"Unable to fetch prices from {self.url}: code {response.status_code}")
+            return []
         return response.json()
 
     def update(self):
         """Update price data."""
-        for row in self.get_rows():
-            time = dateutil.parser.parse(row["DateTime"]).astimezone()
-            price = row["PriceNoTax"]
-            record = Record(time, price=price)
-            price, amount = self._db.add_or_update_record(record)
-            self.price_updated += price
-            self.consumption_updated += amount
+        futures = [
+            run_in_daemon(self.get_rows, area, name=f"prices-{area}")
+            for area in self._areas
+        ]
+        results = [future.result() for future in futures]
+        for area, rows in zip(self._areas, results):
+            self.price_updated += self._db.upsert_area_prices(
+                area,
+                [row["DateTime"] for row in rows],
+                [row["PriceNoTax"] for row in rows],
+            )
         return (self.price_updated, self.consumption_updated)
 
 
 class ConsumptionSource(AbstractSource):
-    """Update consumption data from a csv file downloaded from oma.datahub.fi."""
+    """Update consumption data from a csv file downloaded from oma.datahub.fi.
 
-    def __init__(self, database, local_file):
+    If the database supports sites, consumption is stored per metering point
+    ('Mittauspisteen tunnus'), so a file with several metering points updates
+    each of them and the total consumption.
+
+    With a checkpoint file, only the rows appended to the csv file after the
+    previous import are read. The checkpoint records the size and the
+    modification time of the file, the byte offset after the last consumed
+    row and a hash of the consumed prefix, and it is written with
+    `save_checkpoint` once the imported data has been saved.
+    """
+
+    prefix_size = 65536
+
+    def __init__(self, database, local_file, checkpoint_file=None):
+        """Construct a new ConsumptionSource object.
+
+        Args:
+            database: database to update
+            local_file (str): csv file downloaded from oma.datahub.fi
+            checkpoint_file (str, optional): file to keep the checkpoint in,
+                by default the whole file is imported on every update
+
+        Returns:
+            A new ConsumptionSource object.
+        """
         if not os.path.exists(local_file):
-            warnings.warn(f"consumption file {local_file} not found, unable to update!")
+            warn(f"consumption file {local_file} not found, unable to update!")
             local_file = None
         self._db = database
         self._local_file = local_file
+        self._checkpoint_file = checkpoint_file
+        self._site = "Mittauspisteen tunnus"
+        self.checkpoint = None
         self.price_updated = 0
         self.consumption_updated = 0
 
+    def _hash_prefix(self, file, offset):
+        """Return hash of the head and of the end of the first offset bytes.
+
+        Reading a fixed amount of data keeps the cost of the check constant,
+        and rewritten headers and rewritten rows before the offset are both
+        detected in the usual case of a file exported again.
+        """
+        digest = hashlib.sha256()
+        file.seek(0)
+        digest.update(file.read(min(offset, self.prefix_size)))
+        file.seek(max(offset - self.prefix_size, 0))
+        digest.update(file.read(offset - file.tell()))
+        return digest.hexdigest()
+
+    def _read_checkpoint(self):
+        """Return the stored checkpoint, or None."""
+        if self._checkpoint_file is None:
+            return None
+        try:
+            with open(self._checkpoint_file, "r", encoding="utf-8") as file:
+                checkpoint = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("file") != os.path.abspath(self._local_file):
+            return None
+        return checkpoint
+
+    def _get_offset(self, file, stat):
+        """Return byte offset to continue reading from, 0 for a full import."""
+        checkpoint = self._read_checkpoint()
+        if checkpoint is None or stat.st_size < checkpoint["offset"]:
+            return 0
+        if (stat.st_size, stat.st_mtime_ns) == (
+            checkpoint["size"],
+            checkpoint["mtime"],
+        ):
+            return checkpoint["offset"]
+        if self._hash_prefix(file, checkpoint["offset"]) != checkpoint["hash"]:
+            return 0
+        return checkpoint["offset"]
+
+    def save_checkpoint(self):
+        """Store the checkpoint of the last update.
+
+        Call this only after the updated database has been saved, otherwise
+        the rows read by the update would be skipped on the next update.
+
+        Returns:
+            Nothing.
+        """
+        if self._checkpoint_file is None or self.checkpoint is None:
+            return
+        tmpfile = f"{self._checkpoint_file}.tmp"
+        with open(tmpfile, "w", encoding="utf-8") as file:
+            json.dump(self.checkpoint, file)
+        os.replace(tmpfile, self._checkpoint_file)
+
+    def _read(self):
+        """Return rows not imported yet as a DataFrame, update the checkpoint."""
+        with open(self._local_file, "rb") as file:
+            stat = os.fstat(file.fileno())
+            offset = self._get_offset(file, stat)
+            file.seek(0)
+            header = file.readline()
+            offset = max(offset, file.tell())
+            file.seek(offset)
+            tail = file.read(stat.st_size - offset)
+            # a row still being written is read on the next update
+            tail = tail[: tail.rfind(b"\n") + 1]
+            offset += len(tail)
+            self.checkpoint = {
+                "file": os.path.abspath(self._local_file),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "offset": offset,
+                "hash": self._hash_prefix(file, offset),
+            }
+        return pd.read_csv(
+            io.BytesIO(header + tail),
+            sep=";",
+            encoding="utf8",
+            usecols=lambda name: name in (self._site, "Alkuaika", "Määrä"),
+            dtype={self._site: str, "Määrä": float},
+        )
+
     def update(self):
         """Update consumption data."""
         if self._local_file is None:
             return (self.price_updated, self.consumption_updated)
-        with open(self._local_file, "r", encoding="utf8") as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=";")
-            for row in reader:
-                time = dateutil.parser.parse(row["Alkuaika"])
-                amount = float(row["Määrä"])
-                record = Record(time, amount=amount)
-                price, amount = self._db.add_or_update_record(record)
-                self.price_updated += price
-                self.consumption_updated += amount
+        data = self._read()
+        if len(data) == 0:
+            return (self.price_updated, self.consumption_updated)
+        if self._db.supports_sites and self._site in data:
+            for site, rows in data.groupby(self._site, sort=False):
+                self.consumption_updated += self._db.upsert_site_amounts(
+                    site, rows["Alkuaika"].to_numpy(), rows["Määrä"].to_numpy()
+                )
+            return (self.price_updated, self.consumption_updated)
+        price, amount = self._db.upsert_many(
+            data["Alkuaika"].to_numpy(), amounts=data["Määrä"].to_numpy()
+        )
+        self.price_updated += price
+        self.consumption_updated += amount
         return (self.price_updated, self.consumption_updated)
 
 
 class GenericSource(AbstractSource):
-    """Update price/consumption data from generic json file."""
+    """Update price/consumption data from generic json file.
 
-    def __init__(self, database, local_file):
+    The file is either a JSON array of rows or newline-delimited JSON, one
+    row per line. Rows are objects with keys 'time', 'price' and 'amount'.
+    The file is read as a stream and rows are added to the database in
+    batches, so memory use doesn't depend on the size of the file.
+    """
+
+    def __init__(self, database, local_file, batch_size=10000):
         if not os.path.exists(local_file):
-            warnings.warn(f"json file {local_file} not found, unable to update!")
+            warn(f"json file {local_file} not found, unable to update!")
             local_file = None
         self._db = database
         self._local_file = local_file
+        self._batch_size = batch_size
         self.price_updated = 0
         self.consumption_updated = 0
 
+    def _upsert(self, rows):
+        price, amount = self._db.upsert_many(
+            [row["time"] for row in rows],
+            prices=[row.get("price", math.nan) for row in rows],
+            amounts=[row.get("amount", math.nan) for row in rows],
+        )
+        self.price_updated += price
+        self.consumption_updated += amount
+
     def update(self):
         """Update price/consumption data."""
         if self._local_file is None:
             return (self.price_updated, self.consumption_updated)
         with open(self._local_file, "r", encoding="utf-8") as file:
-            rows = json.load(file)
-            for row in rows:
-                record = Record(row["time"], price=row["price"], amount=row["amount"])
-                price, amount = self._db.add_or_update_record(record)
-                self.price_updated += price
-                self.consumption_updated += amount
+            rows = iter_json(file)
+            while True:
+                batch = list(itertools.islice(rows, self._batch_size))
+                if not batch:
+                    break
+                self._upsert(batch)
         return (self.price_updated, self.consumption_updated)
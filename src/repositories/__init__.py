@@ -1 +1,7 @@
-from .database import Database
+from .records import Database, DatabaseView
+from .columnar import ColumnarDatabase
+from .sqlite import SqliteDatabase
+from .partitioned import PartitionedDatabase
+from .journal import Journal
+from .rollups import Rollups
+from .gaps import GapIndex
@@ -0,0 +1,203 @@
+"""Helpers for sorted arrays of time stamps, prices and amounts.
+
+Shared by the storage engines for batch upserts and merges, see
+`AbstractDatabase.upsert_many` and `AbstractDatabase.merge`.
+"""
+
+import bisect
+import datetime
+from dateutil.tz import tzutc
+import numpy as np
+import pandas as pd
+from entities.timeparsing import parse_time
+
+
+def _to_datetime(time):
+    """Convert unix time stamp, string or datetime to a timezone-aware datetime.
+
+    Datetime without time zone is assumed to be UTC.
+    """
+    if isinstance(time, int):
+        return datetime.datetime.fromtimestamp(time, tzutc())
+    if isinstance(time, str):
+        time = parse_time(time)
+    if not time.tzinfo:
+        time = time.replace(tzinfo=tzutc())
+    return time
+
+
+def _find_range(times, start, end=None):
+    """Find index range of sorted times s.t. start <= times <= end.
+
+    Args:
+        times: sorted list of datetimes
+        start (string or datetime)
+        end (string or datetime, optional)
+
+    Returns:
+        tuple (first, last), range is times[first:last]
+    """
+    first = bisect.bisect_left(times, _to_datetime(start))
+    last = len(times)
+    if end is not None:
+        last = bisect.bisect_right(times, _to_datetime(end))
+    return (first, last)
+
+
+def _sort_arrays(times, prices, amounts):
+    """Sort arrays by time.
+
+    Raises:
+        KeyError, if the same time is found more than once.
+
+    Returns:
+        tuple (times, prices, amounts) sorted by time.
+    """
+    if np.any(np.diff(times) <= 0):
+        order = np.argsort(times, kind="stable")
+        times, prices, amounts = times[order], prices[order], amounts[order]
+        duplicates = np.flatnonzero(np.diff(times) == 0)
+        if len(duplicates) > 0:
+            time = pd.Timestamp(times[duplicates[0]], unit="s", tz="UTC")
+            raise KeyError(f"Record {time} already exists!")
+    return (times, prices, amounts)
+
+
+def _get_resolution(times, default=3600):
+    """Return typical interval of sorted unix time stamps in seconds.
+
+    The most common interval is used, so that missing data doesn't change the
+    result, and of equally common intervals the shortest one, because a gap
+    is always longer than the resolution. If there are less than two time
+    stamps, default is returned.
+    """
+    if len(times) < 2:
+        return default
+    intervals, counts = np.unique(np.diff(times), return_counts=True)
+    return int(intervals[np.argmax(counts)])
+
+
+def _to_epochs(times):
+    """Convert an array of times to unix time stamps.
+
+    Args:
+        times: unix time stamps, datetimes or strings. Time without time zone
+            is assumed to be UTC.
+
+    Returns:
+        numpy array of int64
+
+    Notes:
+        Datetime indexes and series, also timezone-aware ones, are converted
+        as arrays of UTC datetime64 values in one operation. Only strings
+        and other objects are parsed with `pd.to_datetime`.
+    """
+    if isinstance(times, (pd.DatetimeIndex, pd.Series)) and (
+        pd.api.types.is_datetime64_any_dtype(times.dtype)
+    ):
+        # values of a timezone-aware index are UTC datetime64 values
+        times = pd.DatetimeIndex(times).values
+    times = np.asarray(times)
+    if times.dtype.kind in "iuf":
+        return times.astype(np.int64)
+    if times.dtype.kind != "M":
+        times = pd.to_datetime(times, utc=True).values
+    return times.astype("datetime64[s]").astype(np.int64)
+
+
+def _prepare_batch(times, prices=None, amounts=None):
+    """Convert a batch of data to sorted arrays without duplicate times.
+
+    Args:
+        times: unix time stamps, datetimes or strings
+        prices (optional): energy prices, missing by default
+        amounts (optional): energy amounts, missing by default
+
+    Returns:
+        tuple (times, prices, amounts)
+
+    Notes:
+        If the same time is given more than once, the last value which is not
+        nan is used, like when adding the rows one by one.
+    """
+    times = _to_epochs(times)
+    columns = [
+        np.full(len(times), np.nan)
+        if values is None
+        else np.asarray(values, dtype=float)
+        for values in (prices, amounts)
+    ]
+    if np.any(np.diff(times) <= 0):
+        frame = pd.DataFrame({"price": columns[0], "amount": columns[1]})
+        frame = frame.groupby(times, sort=True).last()
+        times = frame.index.to_numpy(dtype=np.int64)
+        columns = [frame[name].to_numpy(dtype=float) for name in ("price", "amount")]
+    return (times, columns[0], columns[1])
+
+
+def _same(values1, values2):
+    """Compare arrays elementwise, nan being equal to nan."""
+    return (values1 == values2) | (np.isnan(values1) & np.isnan(values2))
+
+
+def _match_sorted(left, right):
+    """Find equal values of two sorted arrays without duplicates.
+
+    Args:
+        left: sorted array
+        right: sorted array
+
+    Returns:
+        tuple of index arrays (left_idx, right_idx), s.t.
+        left[left_idx] == right[right_idx].
+
+    Notes:
+        The arrays are concatenated and sorted with a stable sort, which is a
+        linear merge of two sorted runs, so the cost is O(n + m). Equal values
+        are then next to each other, the one from left first.
+    """
+    values = np.concatenate([left, right])
+    order = np.argsort(values, kind="stable")
+    pairs = np.flatnonzero(np.diff(values[order]) == 0)
+    return (order[pairs], order[pairs + 1] - len(left))
+
+
+def _merge_arrays(old, new, overwrite=False):
+    """Merge sorted arrays of new data to sorted arrays of old data.
+
+    Rows of new data having the same time as old data update the old values,
+    except where new value is nan. Other rows are inserted.
+
+    Args:
+        old: tuple (times, prices, amounts)
+        new: tuple (times, prices, amounts)
+        overwrite (bool, optional): if True, nan values of new data also
+            replace old values
+
+    Returns:
+        tuple (merged, added, price_updated, amount_updated), where merged is
+        a tuple (times, prices, amounts) and the boolean arrays tell, for each
+        row of new data, was the row added and was the price and the amount
+        added or changed.
+    """
+    times, prices, amounts = old
+    new_times, new_prices, new_amounts = new
+    idx = np.searchsorted(times, new_times)
+    exists = np.zeros(len(new_times), dtype=bool)
+    if len(times) > 0:
+        exists = times[np.minimum(idx, len(times) - 1)] == new_times
+    positions = idx[exists]
+    merged = [np.insert(times, idx[~exists], new_times[~exists])]
+    updated = []
+    for column, values in ((prices, new_prices), (amounts, new_amounts)):
+        column = np.array(column, dtype=float)
+        changed = ~exists & ~np.isnan(values)
+        existing = values[exists]
+        changes = (overwrite | ~np.isnan(existing)) & ~_same(
+            column[positions], existing
+        )
+        changed[exists] = changes
+        column[positions[changes]] = existing[changes]
+        merged.append(np.insert(column, idx[~exists], values[~exists]))
+        updated.append(changed)
+    return (tuple(merged), ~exists, updated[0], updated[1])
@@ -0,0 +1,74 @@
+"""Fixed-width binary file format for databases.
+
+The file starts with a header, after which follows one column for each of
+time, price and amount:
+
+- header: magic bytes b"SAEHAEKK", format version (uint32), number of
+  columns (uint32) and number of rows (uint64), 24 bytes in total
+- time: unix time stamps as little-endian int64
+- price: little-endian float64, missing values as nan
+- amount: little-endian float64, missing values as nan
+
+Because every column has a fixed width, the file can be memory-mapped and the
+columns used directly as NumPy arrays without parsing anything.
+"""
+
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"SAEHAEKK"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+DTYPES = ("<i8", "<f8", "<f8")
+
+
+def write_binary(out, times, prices, amounts):
+    """Write columns to a stream in binary format.
+
+    Args:
+        out: binary stream
+        times: unix time stamps
+        prices: energy prices
+        amounts: energy amounts
+
+    Returns:
+        Nothing.
+    """
+    out.write(HEADER.pack(MAGIC, VERSION, len(DTYPES), len(times)))
+    for column, dtype in zip((times, prices, amounts), DTYPES):
+        out.write(np.ascontiguousarray(column, dtype=dtype).data)
+
+
+def read_binary(input_):
+    """Map columns of a binary file to memory.
+
+    Args:
+        input_: file opened in binary mode
+
+    Raises:
+        ValueError, if file is not a valid database file.
+
+    Returns:
+        tuple of read-only arrays (times, prices, amounts)
+
+    Notes:
+        The file is mapped read-only, so several processes can share the same
+        pages. The mapping stays alive as long as the arrays are referenced,
+        also after the file itself is closed.
+    """
+    buffer = mmap.mmap(input_.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < HEADER.size:
+        raise ValueError("Invalid database file: header is truncated")
+    magic, version, ncolumns, nrows = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Invalid database file: unknown file type")
+    if version != VERSION or ncolumns != len(DTYPES):
+        raise ValueError(f"Invalid database file: unsupported version {version}")
+    if len(buffer) < HEADER.size + 8 * ncolumns * nrows:
+        raise ValueError("Invalid database file: data is truncated")
+    columns = []
+    for i, dtype in enumerate(DTYPES):
+        offset = HEADER.size + 8 * i * nrows
+        columns.append(np.frombuffer(buffer, dtype=dtype, count=nrows, offset=offset))
+    return tuple(columns)
@@ -0,0 +1,695 @@
+from collections.abc import Mapping
+from datetime import datetime
+import math
+from dateutil.tz import tzutc
+import numpy as np
+import pandas as pd
+from entities import Record
+from entities.timeparsing import parse_time
+from .database import AbstractDatabase, _read_csv_frame
+from .arrays import _merge_arrays, _prepare_batch
+from .rollups import get_local_days
+
+# prefixes of the names of the consumption columns of sites and the price
+# columns of bidding areas, also used in csv
+SITE_PREFIX = "amount:"
+AREA_PREFIX = "price:"
+
+
+def to_epoch(time):
+    """Convert time to unix time stamp.
+
+    Args:
+        time: integer (unix time stamp), string or datetime
+
+    Returns:
+        integer
+
+    Notes:
+        Follows the same conventions as Record: datetime without time zone is
+        assumed to be in UTC.
+    """
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    if isinstance(time, str):
+        time = parse_time(time)
+    if not time.tzinfo:
+        time = time.replace(tzinfo=tzutc())
+    return int(time.timestamp())
+
+
+def _get_midnight(day, timezone, days=0):
+    """Return unix time stamp of the local midnight starting a day.
+
+    Args:
+        day (str or datetime): the day, time of the day is ignored
+        timezone (str): time zone of the day
+        days (int, optional): number of days to add
+
+    Returns:
+        integer
+    """
+    day = pd.Timestamp(day)
+    if day.tzinfo is not None:
+        day = day.tz_convert(timezone).tz_localize(None)
+    midnight = day.normalize() + pd.Timedelta(days=days)
+    return int(midnight.tz_localize(timezone).timestamp())
+
+
+class RecordsView(Mapping):
+    """Read-only mapping from time to Record on top of columnar arrays.
+
+    Records are not stored anywhere, they are created when asked. Iterating
+    over keys gives timezone-aware datetimes like the mapping returned by
+    `Database.get_records`.
+    """
+
+    def __init__(self, times, prices, amounts):
+        self._times = times
+        self._prices = prices
+        self._amounts = amounts
+
+    def _record(self, idx):
+        return Record.from_epoch(
+            int(self._times[idx]), float(self._prices[idx]), float(self._amounts[idx])
+        )
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        for time in self._times.tolist():
+            yield datetime.fromtimestamp(time, tzutc())
+
+    def __getitem__(self, time):
+        epoch = to_epoch(time)
+        idx = np.searchsorted(self._times, epoch)
+        if idx == len(self._times) or self._times[idx] != epoch:
+            raise KeyError(time)
+        return self._record(idx)
+
+    def values(self):
+        return (self._record(idx) for idx in range(len(self)))
+
+    def items(self):
+        return ((record.get_time(), record) for record in self.values())
+
+
+class ColumnarDatabase(AbstractDatabase):
+    """Database storing records column by column in NumPy arrays.
+
+    This is an alternative storage engine for `Database`, having the same
+    interface. Instead of keeping a Record object for every hour, data is
+    stored in three arrays: sorted int64 unix time stamps, and float64 arrays
+    for price and amount. Record objects are created only when asked, and
+    range queries and exporting are array slices.
+
+    Arrays are allocated with some spare capacity, so appending new records
+    to the end of the time series (which is the usual case when updating
+    prices) is cheap.
+
+    Consumption can also be stored per site (metering point). Every site adds
+    one float64 column aligned with the shared time and price arrays, and
+    the amount column is then the total consumption of all sites. In the
+    same way, prices of other bidding areas than the default area are stored
+    in one column per area.
+
+    Typical usage example:
+
+    >>> db = ColumnarDatabase()
+    >>> db.add_record(record1)
+    >>> db.add_record(record2)
+    >>> db.to_dataframe()
+    """
+
+    columns = ("price", "amount")
+    supports_sites = True
+    supports_areas = True
+
+    def __init__(self, capacity=0):
+        """Construct a new ColumnarDatabase object.
+
+        Args:
+            capacity (int, optional): number of records to preallocate
+
+        Returns:
+            A new ColumnarDatabase object.
+        """
+        super().__init__()
+        self._allocate(capacity)
+
+    @classmethod
+    def from_arrays(cls, times, prices, amounts):
+        """Create a new database from arrays.
+
+        Args:
+            times: sorted unix time stamps without duplicates
+            prices: energy prices
+            amounts: energy amounts
+
+        Returns:
+            A new ColumnarDatabase object.
+        """
+        database = cls()
+        database.load_arrays(times, prices, amounts)
+        return database
+
+    @classmethod
+    def _from_columns(cls, times, columns):
+        """Create a new database using arrays as storage as they are.
+
+        Args:
+            times: sorted unix time stamps without duplicates
+            columns: dictionary from column name to array, including the
+                extra columns of sites and areas
+
+        Returns:
+            A new ColumnarDatabase object.
+        """
+        database = cls()
+        database._load_columns(times, columns)
+        return database
+
+    def __len__(self):
+        return self._size
+
+    def _allocate(self, capacity):
+        """Replace storage with new empty arrays."""
+        self._size = 0
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._columns = {name: np.empty(capacity) for name in self.columns}
+
+    def _get_times(self):
+        return self._times[: self._size]
+
+    def _get_column(self, name):
+        return self._columns[name][: self._size]
+
+    def _find(self, epoch):
+        """Return index of time stamp or -1 if not found."""
+        times = self._get_times()
+        idx = int(np.searchsorted(times, epoch))
+        if idx < self._size and times[idx] == epoch:
+            return idx
+        return -1
+
+    def _get_rows(self, start=None, end=None):
+        """Return slice of the rows s.t. start <= time <= end."""
+        times = self._get_times()
+        first, last = 0, self._size
+        if start is not None:
+            first = int(np.searchsorted(times, to_epoch(start), side="left"))
+        if end is not None:
+            last = int(np.searchsorted(times, to_epoch(end), side="right"))
+        return slice(first, last)
+
+    def _reserve(self, capacity):
+        """Grow arrays so that they can hold at least `capacity` records.
+
+        Read-only arrays, e.g. the ones mapped from a binary file, are always
+        copied, so this is also used to make data writable before modifying.
+        """
+        arrays = [self._times, *self._columns.values()]
+        if capacity <= len(self._times) and all(a.flags.writeable for a in arrays):
+            return
+        capacity = max(capacity, 2 * len(self._times), 16)
+        times = np.empty(capacity, dtype=np.int64)
+        times[: self._size] = self._get_times()
+        self._times = times
+        for name in self._columns:
+            column = np.empty(capacity)
+            column[: self._size] = self._get_column(name)
+            self._columns[name] = column
+
+    def _insert(self, epoch, values):
+        """Insert a new row keeping the time stamps sorted.
+
+        Site columns get a missing value.
+        """
+        self._reserve(self._size + 1)
+        idx = int(np.searchsorted(self._get_times(), epoch))
+        for array in [self._times, *self._columns.values()]:
+            array[idx + 1 : self._size + 1] = array[idx : self._size]
+        self._times[idx] = epoch
+        values = dict(zip(self.columns, values))
+        for name, column in self._columns.items():
+            column[idx] = values.get(name, np.nan)
+        self._size += 1
+
+    def _load_columns(self, times, columns):
+        """Use arrays as storage as they are, without touching."""
+        self._size = len(times)
+        self._times = times
+        self._columns = columns
+
+    def _upsert_arrays(self, times, prices, amounts, overwrite=False):
+        """Merge sorted arrays without duplicate times to the database.
+
+        If overwrite is True, nan values also replace existing values.
+
+        Site columns get a missing value for the added times.
+        """
+        merged, added, price_updated, amount_updated = _merge_arrays(
+            self.to_arrays(), (times, prices, amounts), overwrite
+        )
+        changed = np.flatnonzero(added | price_updated | amount_updated)
+        if len(changed) == 0:
+            return (added, price_updated, amount_updated)
+        positions = np.searchsorted(self._get_times(), times[added])
+        columns = {
+            name: np.insert(self._get_column(name), positions, np.nan)
+            for name in self._columns
+        }
+        columns["price"], columns["amount"] = merged[1], merged[2]
+        self._load_columns(merged[0], columns)
+        self._touch(int(times[changed[0]]))
+        return (added, price_updated, amount_updated)
+
+    def has_record(self, record):
+        """Tests does record already exist in database.
+
+        Args:
+            record: a record object to test.
+
+        Returns:
+            boolean
+        """
+        return self._find(record.get_epoch()) >= 0
+
+    def add_record(self, record):
+        """Add new record to database.
+
+        Args:
+            record: a Record object to add.
+
+        Raises:
+            KeyError, if a record with the same time already exists
+
+        Returns:
+            boolean tuple (has_price, has_amount)
+        """
+        if self.has_record(record):
+            raise KeyError(f"Record {record.get_time()} already exists!")
+        epoch = record.get_epoch()
+        self._insert(epoch, (record.get_price(), record.get_amount()))
+        self._touch(epoch)
+        return (record.has_price(), record.has_amount())
+
+    def get_record(self, time):
+        """Return a record from database.
+
+        Args:
+            time: string or datetime representing time.
+
+        Raises:
+            KeyError, if record not found.
+
+        Returns:
+            Record
+        """
+        idx = self._find(to_epoch(time))
+        if idx < 0:
+            raise KeyError(time)
+        return Record.from_epoch(
+            int(self._times[idx]),
+            float(self._columns["price"][idx]),
+            float(self._columns["amount"][idx]),
+        )
+
+    def update_record(self, record):
+        """Update record to database.
+
+        Args:
+            record: a record to update.
+
+        Raises:
+            KeyError, if record with timestamp not found
+
+        Returns:
+            boolean tuple (price_updated, amount_updated)
+
+        Notes:
+            If record price/value contains float('nan'), it won't get updated.
+        """
+        epoch = record.get_epoch()
+        idx = self._find(epoch)
+        if idx < 0:
+            raise KeyError(f"Record {record.get_time()} does not exist!")
+        self._reserve(self._size)
+        updated = []
+        for name, value in zip(self.columns, (record.get_price(), record.get_amount())):
+            column = self._columns[name]
+            changed = not math.isnan(value) and column[idx] != value
+            if changed:
+                column[idx] = value
+            updated.append(bool(changed))
+        if any(updated):
+            self._touch(epoch)
+        return tuple(updated)
+
+    def get_records(self):
+        """Get all records from the database as a sorted mapping.
+
+        Args:
+            Nothing.
+
+        Returns:
+            RecordsView, a mapping from time to Record.
+        """
+        return RecordsView(
+            self._get_times(), self._get_column("price"), self._get_column("amount")
+        )
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time.
+
+        Args:
+            start (string or datetime)
+            end (string or datetime, optional)
+
+        Returns:
+            A new database s.t. start <= records <= end
+
+        Notes:
+            The returned database is a view: its arrays are read-only slices
+            of the arrays of this database, found with binary search, so no
+            data is copied. If the view is modified, it makes a copy of its
+            data first and the modification is not visible in this database.
+        """
+        rows = self._get_rows(start, end)
+        arrays = {name: self._get_column(name)[rows] for name in self._columns}
+        arrays["time"] = self._get_times()[rows]
+        for array in arrays.values():
+            array.flags.writeable = False
+        view = self._from_columns(arrays.pop("time"), arrays)
+        view.dataframe_cache_limit = 0
+        return view
+
+    def clear(self):
+        """Removes all records from a database."""
+        self._allocate(0)
+        self._touch()
+
+    def to_arrays(self):
+        """Export database to arrays.
+
+        Args:
+            Nothing.
+
+        Returns:
+            tuple (times, prices, amounts), where times are unix time stamps.
+
+        Notes:
+            Arrays are views to the storage, not copies.
+        """
+        return (
+            self._get_times(),
+            self._get_column("price"),
+            self._get_column("amount"),
+        )
+
+    def load_arrays(self, times, prices, amounts, copy=True):
+        """Import database from arrays.
+
+        Args:
+            times: unix time stamps, sorted and without duplicates
+            prices: energy prices
+            amounts: energy amounts
+            copy (bool): if False, arrays are used as storage as they are,
+                read-only arrays are then copied only when data is modified
+
+        Returns:
+            Nothing.
+
+        Notes:
+            Existing sites are removed, like all other data.
+        """
+        convert = np.array if copy else np.asarray
+        self._load_columns(
+            convert(times, dtype=np.int64),
+            {
+                "price": convert(prices, dtype=float),
+                "amount": convert(amounts, dtype=float),
+            },
+        )
+        self._touch()
+
+    def get_sites(self):
+        """Return identifiers of the sites (metering points) in the database.
+
+        Args:
+            Nothing.
+
+        Returns:
+            A list of strings, in the order the sites were added.
+        """
+        return self._get_extra_columns(SITE_PREFIX)
+
+    def _get_extra_columns(self, prefix):
+        """Return names of the extra columns with a prefix, without prefix."""
+        return [
+            name[len(prefix) :] for name in self._columns if name.startswith(prefix)
+        ]
+
+    def _add_column(self, name):
+        """Add a new column with missing values, if it doesn't exist yet."""
+        if name not in self._columns:
+            self._reserve(self._size)
+            self._columns[name] = np.full(len(self._times), np.nan)
+
+    def _upsert_column(self, name, times, values):
+        """Add or update values of a column, adding missing times.
+
+        Returns:
+            indices of the changed rows.
+        """
+        times, _, values = _prepare_batch(times, amounts=values)
+        given = ~np.isnan(values)
+        times, values = times[given], values[given]
+        self.upsert_many(times)
+        rows = np.searchsorted(self._get_times(), times)
+        changed = self._columns[name][rows] != values
+        rows = rows[changed]
+        if len(rows) > 0:
+            self._reserve(self._size)
+            self._columns[name][rows] = values[changed]
+        return rows
+
+    def add_site(self, site):
+        """Add a new site with missing consumption, if it doesn't exist yet.
+
+        Args:
+            site (str): identifier of the site, e.g. metering point id
+
+        Returns:
+            Nothing.
+        """
+        self._add_column(SITE_PREFIX + site)
+
+    def _get_site_matrix(self, sites, rows=None):
+        """Return consumption of sites as a 2D array, one row per site.
+
+        If rows are given, only those rows are taken from each column before
+        stacking them.
+        """
+        if rows is None:
+            rows = slice(None)
+        columns = [self._get_column(SITE_PREFIX + site)[rows] for site in sites]
+        if not columns:
+            return np.empty((0, len(self._get_times()[rows])))
+        return np.vstack(columns)
+
+    def upsert_site_amounts(self, site, times, amounts):
+        """Add or update consumption of a site.
+
+        Args:
+            site (str): identifier of the site, added if it doesn't exist
+            times: unix time stamps, datetimes or strings
+            amounts: energy amounts of the site
+
+        Returns:
+            integer, the number of amounts added or changed.
+
+        Notes:
+            Missing times are added with a missing price. Missing (nan)
+            amounts don't overwrite existing values. The amount column of the
+            changed rows is updated to the total consumption of all sites.
+        """
+        self.add_site(site)
+        rows = self._upsert_column(SITE_PREFIX + site, times, amounts)
+        if len(rows) == 0:
+            return 0
+        totals = np.nansum(self._get_site_matrix(self.get_sites(), rows), axis=0)
+        self._columns["amount"][rows] = totals
+        epochs = self._get_times()[rows]
+        self._touch(int(epochs[0]))
+        self._rollups.invalidate_many(epochs)
+        self._gaps.invalidate_many(epochs)
+        self._record_changes(epochs, self._get_column("price")[rows], totals)
+        return len(rows)
+
+    def get_site_amounts(self, start=None, end=None):
+        """Return consumption of all sites.
+
+        Args:
+            start (string or datetime, optional): first time to include
+            end (string or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, one column per site.
+        """
+        rows = self._get_rows(start, end)
+        sites = self.get_sites()
+        index = pd.to_datetime(
+            self._get_times()[rows].astype("datetime64[s]"), utc=True
+        )
+        dataframe = pd.DataFrame(
+            self._get_site_matrix(sites, rows).T, index=index, columns=sites
+        )
+        dataframe.index.name = "time"
+        return dataframe
+
+    def get_site_costs(self, start=None, end=None, timezone="Europe/Helsinki"):
+        """Return daily consumption costs of all sites.
+
+        Args:
+            start (str or datetime, optional): first day to include
+            end (str or datetime, optional): last day to include
+            timezone (str, optional): time zone of the days
+
+        Returns:
+            Pandas DataFrame indexed by local date, one column per site.
+
+        Notes:
+            Costs of all sites are computed at once: the site columns are
+            multiplied with the shared price column and summed to days with
+            `np.add.reduceat`. Hours with a missing price or consumption
+            don't add to the cost. Only the rows of the days between start
+            and end are read.
+        """
+        rows = self._get_rows(
+            None if start is None else _get_midnight(start, timezone),
+            None if end is None else _get_midnight(end, timezone, days=1) - 1,
+        )
+        sites = self.get_sites()
+        times = self._get_times()[rows]
+        prices = self._get_column("price")[rows]
+        with np.errstate(invalid="ignore"):
+            costs = self._get_site_matrix(sites, rows) * prices
+        costs = np.where(np.isfinite(costs), costs, 0.0)
+        days = get_local_days(times, timezone)
+        firsts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])[: len(days)]
+        if len(days) > 0:
+            costs = np.add.reduceat(costs, firsts, axis=1)
+        dataframe = pd.DataFrame(
+            costs.T,
+            index=pd.DatetimeIndex(days[firsts].astype("datetime64[ns]"), name="date"),
+            columns=sites,
+        )
+        return dataframe.loc[start:end]
+
+    def get_areas(self):
+        """Return bidding areas having prices in the database.
+
+        Args:
+            Nothing.
+
+        Returns:
+            A list of strings, the default area first.
+        """
+        return [self.default_area] + self._get_extra_columns(AREA_PREFIX)
+
+    def upsert_area_prices(self, area, times, prices):
+        """Add or update prices of a bidding area.
+
+        Args:
+            area (str): bidding area, e.g. 'SE3', added if it doesn't exist
+            times: unix time stamps, datetimes or strings
+            prices: energy prices of the area
+
+        Returns:
+            integer, the number of prices added or changed.
+
+        Notes:
+            Prices of the default area are the price column, see
+            `upsert_many`. Missing times are added with missing values.
+        """
+        if area == self.default_area:
+            return self.upsert_many(times, prices=prices)[0]
+        self._add_column(AREA_PREFIX + area)
+        rows = self._upsert_column(AREA_PREFIX + area, times, prices)
+        if len(rows) > 0:
+            self._touch(int(self._times[rows[0]]))
+        return len(rows)
+
+    def get_area_prices(self, start=None, end=None):
+        """Return prices of all bidding areas.
+
+        Args:
+            start (string or datetime, optional): first time to include
+            end (string or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, one column per area.
+        """
+        rows = self._get_rows(start, end)
+        areas = self.get_areas()
+        columns = ["price"] + [AREA_PREFIX + area for area in areas[1:]]
+        index = pd.to_datetime(
+            self._get_times()[rows].astype("datetime64[s]"), utc=True
+        )
+        dataframe = pd.DataFrame(
+            {area: self._get_column(name)[rows] for area, name in zip(areas, columns)},
+            index=index,
+        )
+        dataframe.index.name = "time"
+        return dataframe
+
+    def read_csv(self, input_):
+        """Import database from csv format.
+
+        Args:
+            input: stream (file, iostream etc.)
+
+        Raises:
+            KeyError, if file contains the same time more than once.
+
+        Returns:
+            Nothing.
+
+        Notes:
+            Columns 'amount:<site>' are read as consumption of sites and
+            columns 'price:<area>' as prices of bidding areas.
+        """
+        data = _read_csv_frame(input_)
+        columns = {name: data[name].to_numpy(dtype=float) for name in self.columns}
+        for name in data.columns:
+            if name.startswith((SITE_PREFIX, AREA_PREFIX)):
+                columns[name] = data[name].to_numpy(dtype=float)
+        self._load_columns(data["time"].to_numpy(dtype=np.int64), columns)
+        self._touch()
+
+    def write_csv(self, out, utc=True):  # pylint: disable=unused-argument
+        """Export database in csv format.
+
+        Args:
+            out: stream
+            utc (bool): times are always written in UTC, kept for
+                compatibility
+
+        Returns:
+            Nothing.
+
+        Notes:
+            The file format is the same as written by `Database.write_csv`,
+            with an additional column 'amount:<site>' for every site and
+            'price:<area>' for every bidding area except the default. All
+            rows are formatted at once with pandas instead of row by row.
+        """
+        times = np.datetime_as_string(self._get_times().astype("datetime64[s]"))
+        data = pd.DataFrame({"time": np.char.add(times, "+00:00")})
+        for name in self._columns:
+            data[name] = self._get_column(name)
+        data.to_csv(
+            out, index=False, float_format="%0.4f", na_rep="nan", lineterminator="\n"
+        )
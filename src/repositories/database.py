@@ -1,124 +1,541 @@
-from collections import OrderedDict
-import math
 import csv
-import dateutil.parser
-from dateutil.tz import tzutc
+import numpy as np
 import pandas as pd
 from entities import Record
+from .binary import read_binary, write_binary
+from .rollups import Rollups
+from .gaps import GapIndex
+from .arrays import (
+    _get_resolution,
+    _match_sorted,
+    _merge_arrays,
+    _prepare_batch,
+    _sort_arrays,
+    _to_epochs,
+)
+
+
+def _read_csv_frame(input_):
+    """Read csv file in database format to a DataFrame.
+
+    Args:
+        input_: stream
+
+    Raises:
+        KeyError, if the same time is found more than once.
+
+    Returns:
+        DataFrame sorted by time, where time is converted to unix time stamps
+        and all other columns to floats.
+    """
+    try:
+        data = pd.read_csv(input_)
+    except pd.errors.EmptyDataError:
+        data = pd.DataFrame({"time": [], "price": [], "amount": []})
+    data = data.astype({name: float for name in data.columns if name != "time"})
+    times = pd.to_datetime(data["time"], utc=True).values
+    data["time"] = times.astype("datetime64[s]").astype(np.int64)
+    if np.any(np.diff(data["time"].to_numpy()) <= 0):
+        data = data.sort_values("time", kind="stable", ignore_index=True)
+        duplicates = np.flatnonzero(np.diff(data["time"].to_numpy()) == 0)
+        if len(duplicates) > 0:
+            time = pd.Timestamp(data["time"][duplicates[0]], unit="s", tz="UTC")
+            raise KeyError(f"Record {time} already exists!")
+    return data
+
+
+def _parse_csv(input_):
+    """Parse csv file in database format to arrays.
+
+    Args:
+        input_: stream
+
+    Raises:
+        KeyError, if the same time is found more than once.
+
+    Returns:
+        tuple (times, prices, amounts) sorted by time.
+    """
+    data = _read_csv_frame(input_)
+    return (
+        data["time"].to_numpy(dtype=np.int64),
+        data["price"].to_numpy(dtype=float),
+        data["amount"].to_numpy(dtype=float),
+    )
+
+
+class AbstractDatabase:
+    """Abstract Database class.
+
+    Defines the operations shared by all storage engines. Engines implement
+    the record level primitives (`has_record`, `add_record`, `get_record`,
+    `update_record`, `get_records`, `filter_by_time` and `clear`), and get
+    import and export in csv and pandas formats on top of them.
+
+    If change tracking is turned on with `track_changes`, records added or
+    updated are also collected to a list of changes, which can be used to
+    save only the changed data (see `repositories.journal`).
+
+    Every modification increments the version of the database (see
+    `get_version`). The last DataFrame returned by `to_dataframe` is cached
+    until the data changes, so repeated exports are free. If only newer records have
+    been added, they are appended to the cached DataFrame instead of exporting
+    everything again. Databases larger than `dataframe_cache_limit` rows are
+    not cached, and the cache can be dropped with `drop_cache`.
+
+    Daily and monthly consumption, cost and average price are kept as
+    rollups (see `repositories.rollups`), which are updated for the modified
+    days only. In the same way, ranges of missing prices and amounts are kept
+    in a gap index (see `repositories.gaps`).
+    """
 
+    dataframe_cache_limit = 1000000
+    supports_sites = False
+    supports_areas = False
+    default_area = "FI"
+
+    def __init__(self):
+        self._changes = []
+        self._tracking = False
+        self._cleared = False
+        self._version = 0
+        self._dataframe = None
+        self._dataframe_range = None
+        self._dataframe_version = None
+        self._rollups = Rollups()
+        self._gaps = GapIndex()
 
-class Database:
-    """Database to contain and manipulate records.
+    def has_record(self, record):
+        """Tests does record already exist in database."""
+        raise NotImplementedError("Implement this method.")
 
-    The basic implementation of database adds functionality to manipulate a
-    group of records. They can be added and exported to pandas DataFrame. Pandas
-    can then be used to save/load database in various formats. This
-    implementation uses csv file format for now, but basically it could also be
-    easily replaced with SQL database or some other "real" data format.
+    def add_record(self, record):
+        """Add new record to database."""
+        raise NotImplementedError("Implement this method.")
 
-    Typical usage example:
+    def get_record(self, time):
+        """Return a record from database."""
+        raise NotImplementedError("Implement this method.")
 
-    >>> db = Database()
-    >>> db.add_record(record1)
-    >>> db.add_record(record2)
-    >>> db.save("db.csv")
+    def update_record(self, record):
+        """Update record to database."""
+        raise NotImplementedError("Implement this method.")
 
-    Attributes:
-        records: The list of records in database.
-    """
+    def get_records(self):
+        """Get all records from the database as a sorted mapping."""
+        raise NotImplementedError("Implement this method.")
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time."""
+        raise NotImplementedError("Implement this method.")
 
-    def __init__(self, records=None):
-        """Construct a new Database object.
+    def clear(self):
+        """Removes all records from a database."""
+        raise NotImplementedError("Implement this method.")
+
+    def __len__(self):
+        return len(self.get_records())
+
+    def __iter__(self):
+        return iter(self.get_records().values())
+
+    def add_or_update_record(self, record):
+        """Add record to database. If exists, update.
 
         Args:
-            records (OrderedDict, optional): initial data
+            record: a record to add or update.
 
         Returns:
-            A new Database object.
+            integer: 1 if data is updated, 0 otherwise
         """
-        self._records = records or OrderedDict()
+        exists = self.has_record(record)
+        if exists:
+            updated = self.update_record(record)
+        else:
+            updated = self.add_record(record)
+        if not exists or any(updated):
+            self._record_changes(
+                np.array([record.get_epoch()]),
+                np.array([record.get_price()]),
+                np.array([record.get_amount()]),
+            )
+        return updated
 
-    def has_record(self, record):
-        """Tests does record already exist in database.
+    def get_version(self):
+        """Return version of the data, incremented on every modification.
 
         Args:
-            record: a record object to test.
+            Nothing.
 
         Returns:
-            boolean
+            integer
         """
-        return record.get_time() in self._records
+        return self._version
 
-    def add_record(self, record):
-        """Add new record to database.
+    def _touch(self, epoch=None):
+        """Increment version after a modification.
+
+        Args:
+            epoch (int, optional): time of the modified record, if only one
+                record is modified. Cached DataFrame is kept if the record is
+                newer than the cached data, so that it can be appended.
+        """
+        self._version += 1
+        self._rollups.invalidate(epoch)
+        self._gaps.invalidate(epoch)
+        if self._dataframe is None:
+            return
+        index = self._dataframe.index
+        if epoch is None or len(index) == 0 or epoch <= index[-1].timestamp():
+            self.drop_cache()
+
+    def drop_cache(self):
+        """Drop cached DataFrame to free memory.
+
+        Args:
+            Nothing.
+
+        Returns:
+            Nothing.
+        """
+        self._dataframe = None
+        self._dataframe_range = None
+        self._dataframe_version = None
+
+    def upsert_many(self, times, prices=None, amounts=None):
+        """Add or update a batch of records.
 
         Args:
-            record: a Record object to add.
+            times: unix time stamps, datetimes or strings
+            prices (optional): energy prices, missing by default
+            amounts (optional): energy amounts, missing by default
+
+        Returns:
+            tuple (prices_updated, amounts_updated), the number of prices and
+            amounts added or changed.
+
+        Notes:
+            Works like calling `add_or_update_record` for each row, but the
+            whole batch is merged to the existing data at once: missing (nan)
+            values don't overwrite existing values, and if the same time is
+            given more than once, the last value is used.
+        """
+        times, prices, amounts = _prepare_batch(times, prices, amounts)
+        return self._upsert_batch(times, prices, amounts)
+
+    def _upsert_batch(self, times, prices, amounts, overwrite=False):
+        """Upsert prepared arrays and record the changes, see `upsert_many`."""
+        added, price_updated, amount_updated = self._upsert_arrays(
+            times, prices, amounts, overwrite
+        )
+        changed = np.flatnonzero(added | price_updated | amount_updated)
+        self._rollups.invalidate_many(times[changed])
+        self._gaps.invalidate_many(times[changed])
+        self._record_changes(times[changed], prices[changed], amounts[changed])
+        # nan in a change means "not changed", so a cleared value is lost
+        cleared = (price_updated & np.isnan(prices)) | (
+            amount_updated & np.isnan(amounts)
+        )
+        self._cleared |= self._tracking and bool(np.any(cleared))
+        return (int(np.sum(price_updated)), int(np.sum(amount_updated)))
+
+    def merge(self, other, policy="prefer-non-nan"):
+        """Merge another database to this database.
+
+        Args:
+            other: database to merge, of any storage engine
+            policy (str, optional): how to resolve rows having the same time
+                in both databases:
+
+                - 'prefer-left': rows of this database are kept as they are,
+                  only times missing from this database are added
+                - 'prefer-right': rows of other database replace rows of this
+                  database, also with missing (nan) values
+                - 'prefer-non-nan': values of other database replace values
+                  of this database, unless missing, like `upsert_many`
 
         Raises:
-            KeyError, if a record with the same time already exists
+            ValueError, if policy is unknown.
 
         Returns:
-            boolean tuple (has_price, has_amount)
+            dictionary of merge statistics: the number of rows in other
+            database (rows), rows added (added), rows having the same time in
+            both databases (overlapping), overlapping rows with a different
+            price or amount in both databases (conflicts), and the number of
+            prices and amounts added or changed (prices_updated,
+            amounts_updated).
+
+        Notes:
+            Both databases are exported to arrays and matched with a linear
+            merge of the sorted time stamps, see `_match_sorted`, so no Record
+            is created for unchanged rows. Only the time range of the other
+            database is read from this database.
         """
-        if self.has_record(record):
-            raise KeyError(f"Record {record.get_time()} already exists!")
-        self._records[record.get_time()] = record
-        return (record.has_price(), record.has_amount())
+        if policy not in ("prefer-left", "prefer-right", "prefer-non-nan"):
+            raise ValueError(f"Unknown merge policy {policy}")
+        times, prices, amounts = other.to_arrays()
+        old = (np.array([], dtype=np.int64), np.array([]), np.array([]))
+        if len(times) > 0:
+            old = self.filter_by_time(int(times[0]), int(times[-1])).to_arrays()
+        left, right = _match_sorted(old[0], times)
+        conflicts = np.zeros(len(left), dtype=bool)
+        for values1, values2 in ((old[1], prices), (old[2], amounts)):
+            values1, values2 = values1[left], values2[right]
+            conflicts |= ~np.isnan(values1) & ~np.isnan(values2) & (values1 != values2)
+        rows = len(times)
+        if policy == "prefer-left":
+            new = np.ones(len(times), dtype=bool)
+            new[right] = False
+            times, prices, amounts = times[new], prices[new], amounts[new]
+        prices_updated, amounts_updated = self._upsert_batch(
+            times, prices, amounts, overwrite=policy == "prefer-right"
+        )
+        return {
+            "rows": rows,
+            "added": rows - len(left),
+            "overlapping": len(left),
+            "conflicts": int(np.sum(conflicts)),
+            "prices_updated": prices_updated,
+            "amounts_updated": amounts_updated,
+        }
 
-    def get_record(self, time):
-        """Return a record from database.
+    def _upsert_arrays(self, times, prices, amounts, overwrite=False):
+        """Merge sorted arrays without duplicate times to the database.
+
+        If overwrite is True, nan values also replace existing values.
+
+        Returns:
+            tuple of boolean arrays (added, price_updated, amount_updated),
+            see `_merge_arrays`.
+
+        Notes:
+            This implementation merges the arrays and loads the result, which
+            is efficient for engines storing arrays. Other engines should
+            override this.
+        """
+        merged, added, price_updated, amount_updated = _merge_arrays(
+            self.to_arrays(), (times, prices, amounts), overwrite
+        )
+        if np.any(added | price_updated | amount_updated):
+            self.load_arrays(*merged, copy=False)
+        return (added, price_updated, amount_updated)
+
+    def get_sites(self):
+        """Return identifiers of the sites (metering points) in the database.
+
+        Returns:
+            A list of strings, empty if the engine doesn't support sites.
+        """
+        return []
+
+    def get_areas(self):
+        """Return bidding areas having prices in the database.
+
+        Returns:
+            A list of strings, the default area first. Engines not supporting
+            areas have only the default area, which is the price column.
+        """
+        return [self.default_area]
+
+    def upsert_area_prices(self, area, times, prices):
+        """Add or update prices of a bidding area.
 
         Args:
-            time: string or datetime representing time.
+            area (str): bidding area, e.g. 'FI' or 'SE3'
+            times: unix time stamps, datetimes or strings
+            prices: energy prices of the area
 
         Raises:
-            KeyError, if record not found.
+            NotImplementedError, if area is not the default area and the
+                engine doesn't support areas.
 
         Returns:
-            Record
+            integer, the number of prices added or changed.
         """
-        if isinstance(time, str):
-            time = dateutil.parser.parse(time)
-        return self._records[time.replace(tzinfo=tzutc())]
+        if area != self.default_area:
+            raise NotImplementedError("Storage engine doesn't support areas.")
+        return self.upsert_many(times, prices=prices)[0]
 
-    def update_record(self, record):
-        """Update record to database.
+    def get_area_prices(self, start=None, end=None):
+        """Return prices of all bidding areas.
 
         Args:
-            record: a record to update.
+            start (string or datetime, optional): first time to include
+            end (string or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, one column per area.
+        """
+        prices = self.to_dataframe(start, end)["price"]
+        return prices.to_frame(self.default_area)
+
+    def get_price_spread(self, start=None, end=None):
+        """Return the lowest and highest price over bidding areas.
+
+        Args:
+            start (string or datetime, optional): first time to include
+            end (string or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, with columns min, max, spread
+            (max - min) and cheapest (area of the lowest price). Missing
+            prices are ignored, and times without any price are missing.
+        """
+        prices = self.get_area_prices(start, end)
+        values = prices.to_numpy().T
+        lowest = np.fmin.reduce(values, axis=0)
+        highest = np.fmax.reduce(values, axis=0)
+        cheapest = np.argmin(np.where(np.isnan(values), np.inf, values), axis=0)
+        return pd.DataFrame(
+            {
+                "min": lowest,
+                "max": highest,
+                "spread": highest - lowest,
+                "cheapest": np.where(
+                    np.isnan(lowest), None, np.array(prices.columns)[cheapest]
+                ),
+            },
+            index=prices.index,
+        )
+
+    def _select(self, start=None, end=None):
+        """Return database filtered by time, or self if no limits given."""
+        if start is None and end is None:
+            return self
+        return self.filter_by_time(start if start is not None else 0, end)
+
+    def get_resolution(self, start=None, end=None):
+        """Return resolution of the data, i.e. length of one period.
+
+        Args:
+            start (string or datetime, optional): first time to consider
+            end (string or datetime, optional): last time to consider
+
+        Returns:
+            Resolution in seconds, e.g. 3600 for hourly and 900 for 15-minute
+            data. If there is not enough data, 3600 is returned.
+        """
+        return _get_resolution(self._select(start, end).to_arrays()[0])
+
+    def get_daily_rollups(self, start=None, end=None):
+        """Return daily consumption, cost and average price.
+
+        Args:
+            start (str or datetime, optional): first day to include
+            end (str or datetime, optional): last day to include
+
+        Returns:
+            Pandas DataFrame indexed by local date, with columns consumption,
+            cost and price, which is the consumption-weighted average price.
+        """
+        return self._rollups.get_daily(self, start, end)
+
+    def get_monthly_rollups(self, start=None, end=None):
+        """Return monthly consumption, cost and average price.
+
+        Args:
+            start (str or datetime, optional): first month to include
+            end (str or datetime, optional): last month to include
+
+        Returns:
+            Pandas DataFrame indexed by the first day of the month, with
+            columns like in `get_daily_rollups`.
+        """
+        return self._rollups.get_monthly(self, start, end)
+
+    def get_gaps(self, column, start=None, end=None):
+        """Return ranges of missing prices or amounts.
+
+        Args:
+            column (str): 'price' or 'amount'
+            start (str or datetime, optional): return only ranges ending
+                after start
+            end (str or datetime, optional): return only ranges starting
+                before end
 
         Raises:
-            KeyError, if record with timestamp not found
+            KeyError, if column is unknown.
 
         Returns:
-            boolean tuple (price_updated, amount_updated)
+            tuple of arrays (starts, ends), sorted half-open ranges
+            [start, end) in unix time stamps, clipped to [start, end). A
+            period is missing, if there is no row for it inside the time span
+            of the database, or its value is nan.
+        """
+        start, end = (
+            None if time is None else int(_to_epochs([time])[0])
+            for time in (start, end)
+        )
+        return self._gaps.get_gaps(self, column, start, end)
+
+    def track_changes(self, enabled=True):
+        """Turn collecting changes for `pop_changes` on or off.
+
+        Args:
+            enabled (bool, optional): whether to collect changes
+
+        Returns:
+            Nothing.
 
         Notes:
-            If record price/value contains float('nan'), it won't get updated.
+            Tracking is off by default, so that changes nobody reads don't
+            pile up. Turning tracking off forgets the collected changes.
         """
-        if not self.has_record(record):
-            raise KeyError(f"Record {record.get_time()} does not exist!")
-        price = record.get_price()
-        amount = record.get_amount()
-        if math.isnan(price):
-            price = None
-        if math.isnan(amount):
-            amount = None
-        return self._records[record.get_time()].update(price=price, amount=amount)
+        self._tracking = enabled
+        if not enabled:
+            self.clear_changes()
 
-    def add_or_update_record(self, record):
-        """Add record to database. If exists, update.
+    def _record_changes(self, times, prices, amounts):
+        """Collect changed rows as one chunk of arrays, if tracking is on."""
+        if self._tracking and len(times) > 0:
+            self._changes.append((times, prices, amounts))
+
+    def pop_changes(self):
+        """Return changes collected since the last call and forget them.
 
         Args:
-            record: a record to add or update.
+            Nothing.
 
         Returns:
-            integer: 1 if data is updated, 0 otherwise
+            A list of added or updated records, in order of changes.
+
+        Notes:
+            Changes are kept as arrays, and records are created only here.
+        """
+        changes = self._changes
+        self._changes = []
+        self._cleared = False
+        return [
+            Record.from_epoch(*row)
+            for times, prices, amounts in changes
+            for row in zip(times.tolist(), prices.tolist(), amounts.tolist())
+        ]
+
+    def clear_changes(self):
+        """Forget collected changes without creating records.
+
+        Args:
+            Nothing.
+
+        Returns:
+            Nothing.
+        """
+        self._changes = []
+        self._cleared = False
+
+    def has_cleared_values(self):
+        """Tell whether collected changes have cleared values.
+
+        Overwriting merges (see `merge`) can clear a value to nan, which
+        can't be told apart from an unchanged value in the list of changes.
+
+        Args:
+            Nothing.
+
+        Returns:
+            boolean
         """
-        if self.has_record(record):
-            return self.update_record(record)
-        return self.add_record(record)
+        return self._cleared
 
     def sort_records(self):
         """Sort records in-place.
@@ -129,81 +546,149 @@ class Database:
         Returns:
             Nothing.
         """
-        self._records = OrderedDict(sorted(self._records.items()))
 
-    def get_records(self):
-        """Get all records from the database as a sorted ordered dictionary.
+    def to_arrays(self):
+        """Export database to arrays.
 
         Args:
             Nothing.
 
         Returns:
-            A list of records.
+            tuple (times, prices, amounts), where times are unix time stamps.
         """
-        self.sort_records()
-        return self._records
+        records = list(self.get_records().values())
+        times = np.fromiter((record.get_epoch() for record in records), dtype=np.int64)
+        prices = np.array([record.get_price() for record in records], dtype=float)
+        amounts = np.array([record.get_amount() for record in records], dtype=float)
+        return (times, prices, amounts)
 
-    def filter_by_time(self, start, end=None):
-        """Filter records by time.
+    def load_arrays(self, times, prices, amounts, copy=True):
+        """Import database from arrays.
 
         Args:
-            start (string or datetime)
-            end (string or datetime, optional)
+            times: unix time stamps, sorted and without duplicates
+            prices: energy prices
+            amounts: energy amounts
+            copy (bool): engines storing arrays as they are may reuse given
+                arrays instead of copying them if set to False
 
         Returns:
-            A new database s.t. start <= records <= end
+            Nothing.
         """
-        if isinstance(start, str):
-            start = dateutil.parser.parse(start)
-        if not start.tzinfo:
-            start = start.replace(tzinfo=tzutc())
-        if end is not None:
-            if isinstance(end, str):
-                end = dateutil.parser.parse(end)
-            if not end.tzinfo:
-                end = end.replace(tzinfo=tzutc())
-        new_records = OrderedDict()
-        for time in self._records:
-            if (end is not None and start <= time <= end) or (start <= time):
-                new_records[time] = self._records[time]
-        return Database(new_records)
+        self.clear()
+        for time, price, amount in zip(times.tolist(), prices, amounts):
+            self.add_record(Record(time, price=price, amount=amount))
 
-    def clear(self):
-        """Removes all records from a database."""
-        self._records = OrderedDict()
+    def read_binary(self, input_):
+        """Import database from binary format.
 
-    def to_dataframe(self):
-        """Export database to pandas Dataframe.
+        Args:
+            input_: file opened in binary mode
+
+        Returns:
+            Nothing.
+        """
+        self.load_arrays(*read_binary(input_), copy=False)
+
+    def write_binary(self, out):
+        """Export database in binary format.
 
         Args:
+            out: binary stream
+
+        Returns:
             Nothing.
 
+        Notes:
+            See `repositories.binary` for the file format specification.
+        """
+        write_binary(out, *self.to_arrays())
+
+    def to_dataframe(self, start=None, end=None):
+        """Export database to pandas Dataframe.
+
+        Args:
+            start (string or datetime, optional): export only records newer
+                than or equal to start
+            end (string or datetime, optional): export only records older than
+                or equal to end
+
         Returns:
             Pandas DataFrame object.
+
+        Notes:
+            The last export is cached, and the same DataFrame object is
+            returned for the same time range until the data changes, so it
+            must not be modified in place. Make a copy first if needed.
         """
-        index = []
-        price = []
-        amount = []
-        for record in self.get_records().values():
-            index.append(record.get_time())
-            price.append(record.get_price())
-            amount.append(record.get_amount())
-        dataframe = pd.DataFrame({"price": price, "amount": amount}, index=index)
+        key = (start, end)
+        dataframe = self._dataframe
+        stale = dataframe is None or self._dataframe_range != key
+        if not stale and self._dataframe_version != self._version:
+            # only newer records added since the export, append them
+            stale = end is not None
+            if not stale:
+                newest = int(dataframe.index[-1].timestamp())
+                added = self.filter_by_time(newest + 1).to_arrays()
+                dataframe = pd.concat([dataframe, self._export_dataframe(*added)])
+        if stale:
+            if start is not None or end is not None:
+                start = start if start is not None else 0
+                arrays = self.filter_by_time(start, end).to_arrays()
+            else:
+                arrays = self.to_arrays()
+            dataframe = self._export_dataframe(*arrays)
+        self.drop_cache()
+        if len(dataframe) <= self.dataframe_cache_limit:
+            self._dataframe = dataframe
+            self._dataframe_range = key
+            self._dataframe_version = self._version
+        return dataframe
+
+    @staticmethod
+    def _export_dataframe(times, prices, amounts):
+        """Create DataFrame from arrays."""
+        index = pd.to_datetime(times.astype("datetime64[s]"), utc=True)
+        dataframe = pd.DataFrame({"price": prices, "amount": amounts}, index=index)
         dataframe.index.name = "time"
         return dataframe
 
-    def from_dataframe(self, dataframe):
+    def from_dataframe(self, dataframe, mode="replace"):
         """Import database from pandas Dataframe.
 
         Args:
-            dataframe: Pandas DataFrame object.
+            dataframe: Pandas DataFrame object, indexed by time, with columns
+                'price' and/or 'amount'
+            mode (str, optional): 'replace' removes existing data first,
+                'merge' adds new rows and updates existing ones, see
+                `upsert_many`
+
+        Raises:
+            KeyError, if index contains the same time more than once in
+                'replace' mode.
+            ValueError, if mode is unknown.
 
         Returns:
             Nothing.
+
+        Notes:
+            Index and columns are converted to arrays in one pass, without
+            creating a Record for each row. Time without time zone is
+            assumed to be UTC.
         """
-        self.clear()
-        for (time, (price, amount)) in dataframe.iterrows():
-            self.add_record(Record(time, price=price, amount=amount))
+        if mode not in ("replace", "merge"):
+            raise ValueError(f"Unknown mode {mode}")
+        times = _to_epochs(dataframe.index)
+        prices, amounts = (
+            dataframe[column].to_numpy(dtype=float)
+            if column in dataframe
+            else np.full(len(dataframe), np.nan)
+            for column in ("price", "amount")
+        )
+        if mode == "merge":
+            self.upsert_many(times, prices, amounts)
+            return
+        self.load_arrays(*_sort_arrays(times, prices, amounts))
 
     def read_csv(self, input_):
         """Import database from csv format.
@@ -211,23 +696,27 @@ class Database:
         Args:
             input: stream (file, iostream etc.)
 
+        Raises:
+            KeyError, if file contains the same time more than once.
+
         Returns:
             Nothing.
+
+        Notes:
+            The whole file is parsed in one pass to arrays, instead of creating
+            a Record for each row. See `write_csv` for the file format.
         """
-        reader = csv.DictReader(input_)
+        times, prices, amounts = _parse_csv(input_)
         self.clear()
-        for row in reader:
-            record = Record(
-                row["time"], price=float(row["price"]), amount=float(row["amount"])
-            )
-            self.add_record(record)
+        self.load_arrays(times, prices, amounts, copy=False)
 
-    def write_csv(self, out, utc=True):
+    def write_csv(self, out, utc=True):  # pylint: disable=unused-argument
         """Export database in csv format.
 
         Args:
             out: stream
-            utc (bool): convert to UTC time
+            utc (bool): times are always written in UTC, kept for
+                compatibility
 
         Returns:
             Nothing.
@@ -259,7 +748,7 @@ class Database:
         for record in self.get_records().values():
             writer.writerow(
                 {
-                    "time": record.get_time(utc).isoformat(),
+                    "time": record.get_time().isoformat(),
                     "price": f"{record.get_price():0.4f}",
                     "amount": f"{record.get_amount():0.4f}",
                 }
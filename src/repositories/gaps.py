@@ -0,0 +1,197 @@
+import numpy as np
+
+
+def find_gaps(times, values, resolution, start=None, end=None):
+    """Find ranges of missing values in a time series.
+
+    A period is missing, if there is no row for it or its value is nan.
+
+    Args:
+        times: sorted unix time stamps
+        values: values of the rows, nan if missing
+        resolution (int): length of one period in seconds
+        start (int, optional): first time to consider, by default the first
+            row
+        end (int, optional): end of the time range to consider (exclusive),
+            by default the end of the last row
+
+    Returns:
+        tuple of arrays (starts, ends), half-open ranges [start, end) in
+        unix time stamps, sorted and not overlapping.
+    """
+    if start is None:
+        start = times[0] if len(times) > 0 else 0
+    if end is None:
+        end = times[-1] + resolution if len(times) > 0 else 0
+    known = times[~np.isnan(values)]
+    known = known[(known >= start) & (known < end)]
+    # known periods are [t, t + resolution), put virtual known periods just
+    # before and after the range, then every hole between them is a gap
+    edges = np.concatenate([[start - resolution], known, [end]]).astype(np.int64)
+    holes = np.flatnonzero(np.diff(edges) > resolution)
+    return (edges[holes] + resolution, edges[holes + 1])
+
+
+def _coalesce(starts, ends):
+    """Sort ranges and join the ones which overlap or touch each other."""
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    if len(starts) == 0:
+        return (starts, ends)
+    reach = np.maximum.accumulate(ends)
+    heads = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1]])
+    return (starts[heads], np.maximum.reduceat(ends, heads))
+
+
+class GapIndex:
+    """Index of missing prices and amounts of a database.
+
+    For both price and amount, missing data is kept as a sorted set of
+    half-open time ranges [start, end), covering the time span of the
+    database in its resolution (see `AbstractDatabase.get_resolution`). A
+    period is missing, if there is no row for it or its value is nan.
+
+    Ranges are computed once from the whole database. After that, the
+    database tells which times are modified, and on the next query only the
+    time range between the first and the last modified time is scanned again
+    and spliced to the index. If the modified rows are not aligned to the
+    resolution (e.g. 15-minute data is added to hourly data), the whole
+    index is computed again.
+
+    Typical usage example:
+
+    >>> gaps = GapIndex()
+    >>> gaps.get_gaps(db, "price")
+    >>> gaps.invalidate(time)
+    >>> gaps.get_gaps(db, "amount", start, end)
+    """
+
+    columns = ("price", "amount")
+
+    def __init__(self):
+        """Construct a new GapIndex object.
+
+        Returns:
+            A new GapIndex object.
+        """
+        self._gaps = None
+        self._span = None
+        self._resolution = None
+        self._dirty = None
+
+    def invalidate(self, epoch=None):
+        """Mark data of a time modified.
+
+        Args:
+            epoch (int, optional): unix time stamp, by default everything is
+                computed again
+
+        Returns:
+            Nothing.
+        """
+        if epoch is None:
+            self._gaps = None
+            self._dirty = None
+        else:
+            self.invalidate_many([epoch])
+
+    def invalidate_many(self, epochs):
+        """Mark data of many times modified.
+
+        Args:
+            epochs: unix time stamps
+
+        Returns:
+            Nothing.
+        """
+        if self._gaps is None or len(epochs) == 0:
+            return
+        first, last = int(np.min(epochs)), int(np.max(epochs))
+        if self._dirty is not None:
+            first, last = min(first, self._dirty[0]), max(last, self._dirty[1])
+        self._dirty = (first, last)
+
+    def _compute(self, database):
+        """Compute the whole index."""
+        times, prices, amounts = database.to_arrays()
+        self._resolution = database.get_resolution()
+        self._dirty = None
+        self._span = (0, 0)
+        if len(times) > 0:
+            self._span = (int(times[0]), int(times[-1]) + self._resolution)
+        self._gaps = {
+            name: find_gaps(times, values, self._resolution)
+            for name, values in zip(self.columns, (prices, amounts))
+        }
+
+    def _refresh(self, database):
+        """Scan modified time range again."""
+        if self._gaps is None or self._span[1] <= self._span[0]:
+            self._compute(database)
+            return
+        if self._dirty is None:
+            return
+        if database.get_resolution() != self._resolution:
+            # gaps are measured in steps of the resolution
+            self._compute(database)
+            return
+        first, last = self._dirty
+        self._dirty = None
+        # the span of the database may have grown, and the range between the
+        # old span and the modified times has to be scanned, too
+        start = min(first, self._span[1])
+        end = max(last + self._resolution, self._span[0])
+        times, prices, amounts = database.filter_by_time(start, end - 1).to_arrays()
+        if np.any((times - self._span[0]) % self._resolution):
+            self._compute(database)
+            return
+        if len(times) > 0:
+            self._span = (
+                min(self._span[0], int(times[0])),
+                max(self._span[1], int(times[-1]) + self._resolution),
+            )
+        # scan only the part of the range inside the span of the database
+        scan = (max(start, self._span[0]), min(end, self._span[1]))
+        for name, values in zip(self.columns, (prices, amounts)):
+            starts, ends = self._gaps[name]
+            new_starts, new_ends = find_gaps(times, values, self._resolution, *scan)
+            # keep parts of the old ranges outside the scanned range
+            before = starts < scan[0]
+            after = ends > scan[1]
+            self._gaps[name] = _coalesce(
+                np.concatenate(
+                    [starts[before], new_starts, np.maximum(starts[after], scan[1])]
+                ),
+                np.concatenate(
+                    [np.minimum(ends[before], scan[0]), new_ends, ends[after]]
+                ),
+            )
+
+    def get_gaps(self, database, column, start=None, end=None):
+        """Return missing ranges of a column.
+
+        Args:
+            database: database, whose data has been indexed
+            column (str): 'price' or 'amount'
+            start (int, optional): return only ranges ending after start
+            end (int, optional): return only ranges starting before end
+
+        Raises:
+            KeyError, if column is unknown.
+
+        Returns:
+            tuple of arrays (starts, ends), half-open ranges [start, end) in
+            unix time stamps, sorted and not overlapping. Ranges are clipped
+            to [start, end).
+        """
+        if column not in self.columns:
+            raise KeyError(f"Unknown column {column}")
+        self._refresh(database)
+        starts, ends = self._gaps[column]
+        if start is not None:
+            keep = ends > start
+            starts, ends = np.maximum(starts[keep], start), ends[keep]
+        if end is not None:
+            keep = starts < end
+            starts, ends = starts[keep], np.minimum(ends[keep], end)
+        return (starts, ends)
@@ -0,0 +1,103 @@
+import os
+from entities import Record
+
+
+class Journal:
+    """Append-only journal of database changes.
+
+    Instead of rewriting the whole database file after every update, changed
+    records are appended to a journal file next to the database. When the
+    database is loaded, journal is replayed on top of it. From time to time,
+    the journal is compacted, i.e. the whole database is written to the base
+    file and the journal is removed.
+
+    Each line of the journal is one change in format `time,price,amount`,
+    where a missing value (nan) means that the value is not changed.
+
+    Typical usage example:
+
+    >>> journal = Journal("db.csv.journal")
+    >>> journal.append(db.pop_changes())
+    >>> journal.replay(db)
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+
+    def get_filename(self):
+        """Return file name of the journal."""
+        return self._filename
+
+    def exists(self):
+        """Return whether journal file exists."""
+        return os.path.exists(self._filename)
+
+    def append(self, records):
+        """Append changes to the journal.
+
+        Args:
+            records: an iterable of changed records
+
+        Returns:
+            Number of appended entries.
+
+        Notes:
+            File is synced to disk before returning.
+        """
+        lines = []
+        for record in records:
+            time = record.get_time().isoformat()
+            lines.append(f"{time},{record.get_price()!r},{record.get_amount()!r}\n")
+        if not lines:
+            return 0
+        with open(self._filename, "a", encoding="utf-8") as out:
+            out.writelines(lines)
+            out.flush()
+            os.fsync(out.fileno())
+        return len(lines)
+
+    def read(self):
+        """Read changes from the journal.
+
+        Returns:
+            A list of records.
+
+        Notes:
+            Last line is skipped if it is incomplete, which happens if writing
+            has been interrupted.
+        """
+        if not self.exists():
+            return []
+        records = []
+        with open(self._filename, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                time, price, amount = line.rstrip("\n").split(",")
+                records.append(Record(time, price=float(price), amount=float(amount)))
+        return records
+
+    def replay(self, database):
+        """Apply changes in the journal to a database.
+
+        Args:
+            database: database to update
+
+        Returns:
+            Number of replayed entries.
+        """
+        records = self.read()
+        for record in records:
+            database.add_or_update_record(record)
+        return len(records)
+
+    def __len__(self):
+        if not self.exists():
+            return 0
+        with open(self._filename, "r", encoding="utf-8") as file:
+            return sum(1 for _ in file)
+
+    def remove(self):
+        """Remove journal file."""
+        if self.exists():
+            os.remove(self._filename)
@@ -0,0 +1,379 @@
+from collections import OrderedDict
+import datetime
+import os
+import re
+import numpy as np
+from .database import AbstractDatabase
+from .columnar import ColumnarDatabase, RecordsView, to_epoch
+
+
+def _get_month(epoch):
+    """Return month of unix time stamp as string, e.g. '2022-12'."""
+    return str(np.datetime64(int(epoch), "s").astype("datetime64[M]"))
+
+
+def _split_by_month(times):
+    """Split sorted unix time stamps by month.
+
+    Returns:
+        A list of tuples (month, start, end), where times[start:end] are the
+        time stamps of the month.
+    """
+    months = np.asarray(times).astype("datetime64[s]").astype("datetime64[M]")
+    _, first = np.unique(months, return_index=True)
+    return [
+        (_get_month(times[start]), start, end)
+        for start, end in zip(first, list(first[1:]) + [len(times)])
+    ]
+
+
+class PartitionedDatabase(AbstractDatabase):
+    """Database stored in monthly partitions.
+
+    Data is stored in a directory, one binary file (see `repositories.binary`)
+    per month, e.g. `db.parts/2022-12.bin`. Partitions are loaded only when a
+    query touches them: when connecting, only the current and the previous
+    month are mapped to memory, which is what the user interfaces show. Older
+    partitions are loaded on demand, e.g. by `to_dataframe(start, end)`.
+
+    At most `max_partitions` partitions are kept in memory. When the limit is
+    exceeded, the least recently used partition is dropped, and written to
+    disk first if it has been modified. `commit` writes all modified
+    partitions to disk.
+
+    Typical usage example:
+
+    >>> db = PartitionedDatabase("db.parts")
+    >>> db.add_or_update_record(record)
+    >>> db.commit()
+    >>> db.to_dataframe("2021-01-01", "2021-12-31")
+    """
+
+    extension = ".bin"
+    pattern = re.compile(r"^(\d{4}-\d{2})\.bin$")
+
+    def __init__(self, directory=None, max_partitions=12):
+        """Construct a new PartitionedDatabase object.
+
+        Args:
+            directory (str, optional): directory of partitions, by default
+                data is kept in memory only
+            max_partitions (int, optional): maximum number of partitions kept
+                in memory when data is stored to a directory
+
+        Returns:
+            A new PartitionedDatabase object.
+        """
+        super().__init__()
+        self._directory = None
+        self._max_partitions = max_partitions
+        self._partitions = OrderedDict()
+        self._months = set()
+        self._dirty = set()
+        self._removed = set()
+        if directory is not None:
+            self.connect(directory)
+
+    def connect(self, directory):
+        """Connect to a directory of partitions.
+
+        Args:
+            directory (str): directory of partitions
+
+        Returns:
+            Nothing.
+
+        Notes:
+            Modifications not committed are lost. Current and previous
+            month are loaded immediately.
+        """
+        self._directory = directory
+        self._partitions = OrderedDict()
+        self._dirty = set()
+        self._removed = set()
+        self._months = set()
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                match = self.pattern.match(filename)
+                if match:
+                    self._months.add(match.group(1))
+        now = np.datetime64(datetime.datetime.utcnow(), "M")
+        for month in (now - 1, now):
+            self._get_partition(str(month))
+        self._touch()
+
+    def get_filename(self):
+        """Return directory of partitions."""
+        return self._directory
+
+    def get_resident_months(self):
+        """Return months of the partitions currently in memory."""
+        return list(self._partitions)
+
+    def _get_path(self, month):
+        return os.path.join(self._directory, f"{month}{self.extension}")
+
+    def _write_partition(self, month, partition):
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._get_path(month)
+        with open(f"{path}.tmp", "wb") as out:
+            partition.write_binary(out)
+        os.replace(f"{path}.tmp", path)
+        self._dirty.discard(month)
+
+    def _get_partition(self, month, create=False):
+        """Return partition of a month, loading it if needed.
+
+        Args:
+            month (str): month, e.g. '2022-12'
+            create (bool): create a new partition if it doesn't exist
+
+        Returns:
+            ColumnarDatabase or None, if partition doesn't exist.
+        """
+        if month in self._partitions:
+            self._partitions.move_to_end(month)
+            return self._partitions[month]
+        if month in self._months:
+            partition = ColumnarDatabase()
+            with open(self._get_path(month), "rb") as file:
+                partition.read_binary(file)
+        elif create:
+            partition = ColumnarDatabase()
+            self._months.add(month)
+        else:
+            return None
+        self._partitions[month] = partition
+        self._evict()
+        return partition
+
+    def _evict(self):
+        """Drop least recently used partitions exceeding the limit."""
+        if self._directory is None:
+            return
+        while len(self._partitions) > self._max_partitions:
+            month, partition = self._partitions.popitem(last=False)
+            if month in self._dirty:
+                self._write_partition(month, partition)
+
+    def _get_months(self, start=None, end=None):
+        """Return sorted list of existing months between start and end."""
+        months = sorted(self._months)
+        if start is not None:
+            months = [m for m in months if m >= _get_month(to_epoch(start))]
+        if end is not None:
+            months = [m for m in months if m <= _get_month(to_epoch(end))]
+        return months
+
+    def commit(self):
+        """Write modified partitions to disk.
+
+        Args:
+            Nothing.
+
+        Returns:
+            Nothing.
+        """
+        if self._directory is None:
+            return
+        for month in sorted(self._dirty):
+            self._write_partition(month, self._partitions[month])
+        for month in self._removed - self._months:
+            if os.path.exists(self._get_path(month)):
+                os.remove(self._get_path(month))
+        self._removed = set()
+
+    def close(self):
+        """Commit changes and drop all partitions from memory."""
+        self.commit()
+        self._partitions = OrderedDict()
+
+    def __len__(self):
+        return sum(len(self._get_partition(month)) for month in self._get_months())
+
+    def has_record(self, record):
+        """Tests does record already exist in database.
+
+        Args:
+            record: a record object to test.
+
+        Returns:
+            boolean
+        """
+        partition = self._get_partition(_get_month(record.get_epoch()))
+        return partition is not None and partition.has_record(record)
+
+    def add_record(self, record):
+        """Add new record to database.
+
+        Args:
+            record: a Record object to add.
+
+        Raises:
+            KeyError, if a record with the same time already exists
+
+        Returns:
+            boolean tuple (has_price, has_amount)
+        """
+        epoch = record.get_epoch()
+        month = _get_month(epoch)
+        result = self._get_partition(month, create=True).add_record(record)
+        self._dirty.add(month)
+        self._touch(epoch)
+        return result
+
+    def get_record(self, time):
+        """Return a record from database.
+
+        Args:
+            time: string or datetime representing time.
+
+        Raises:
+            KeyError, if record not found.
+
+        Returns:
+            Record
+        """
+        partition = self._get_partition(_get_month(to_epoch(time)))
+        if partition is None:
+            raise KeyError(time)
+        return partition.get_record(time)
+
+    def update_record(self, record):
+        """Update record to database.
+
+        Args:
+            record: a record to update.
+
+        Raises:
+            KeyError, if record with timestamp not found
+
+        Returns:
+            boolean tuple (price_updated, amount_updated)
+        """
+        epoch = record.get_epoch()
+        month = _get_month(epoch)
+        partition = self._get_partition(month)
+        if partition is None:
+            raise KeyError(f"Record {record.get_time()} does not exist!")
+        updated = partition.update_record(record)
+        if any(updated):
+            self._dirty.add(month)
+            self._touch(epoch)
+        return updated
+
+    def _upsert_arrays(self, times, prices, amounts, overwrite=False):
+        """Merge sorted arrays without duplicate times to the database.
+
+        If overwrite is True, nan values also replace existing values.
+
+        Returns:
+            tuple of boolean arrays (added, price_updated, amount_updated)
+
+        Notes:
+            Batch is split by month, and only the partitions of those months
+            are loaded and modified.
+        """
+        masks = [np.zeros(len(times), dtype=bool) for _ in range(3)]
+        for month, start, end in _split_by_month(times):
+            partition = self._get_partition(month, create=True)
+            # pylint: disable=protected-access
+            result = partition._upsert_arrays(
+                times[start:end], prices[start:end], amounts[start:end], overwrite
+            )
+            for mask, values in zip(masks, result):
+                mask[start:end] = values
+            if np.any(result):
+                self._dirty.add(month)
+        changed = np.flatnonzero(np.any(masks, axis=0))
+        if len(changed) > 0:
+            self._touch(int(times[changed[0]]))
+        return tuple(masks)
+
+    def get_records(self):
+        """Get all records from the database as a sorted mapping.
+
+        Args:
+            Nothing.
+
+        Returns:
+            RecordsView, a mapping from time to Record.
+
+        Notes:
+            All partitions are loaded.
+        """
+        return RecordsView(*self.to_arrays())
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time.
+
+        Args:
+            start (string or datetime)
+            end (string or datetime, optional)
+
+        Returns:
+            A new ColumnarDatabase s.t. start <= records <= end
+
+        Notes:
+            Only the partitions inside the time range are loaded.
+        """
+        arrays = [
+            self._get_partition(month).filter_by_time(start, end).to_arrays()
+            for month in self._get_months(start, end)
+        ]
+        return ColumnarDatabase.from_arrays(*self._concatenate(arrays))
+
+    @staticmethod
+    def _concatenate(arrays):
+        if not arrays:
+            return (np.array([], dtype=np.int64), np.array([]), np.array([]))
+        return tuple(np.concatenate(columns) for columns in zip(*arrays))
+
+    def clear(self):
+        """Removes all records from a database.
+
+        Notes:
+            Partition files are removed on next commit.
+        """
+        self._removed |= self._months
+        self._months = set()
+        self._partitions = OrderedDict()
+        self._dirty = set()
+        self._touch()
+
+    def to_arrays(self):
+        """Export database to arrays.
+
+        Args:
+            Nothing.
+
+        Returns:
+            tuple (times, prices, amounts), where times are unix time stamps.
+        """
+        arrays = [
+            self._get_partition(month).to_arrays() for month in self._get_months()
+        ]
+        return self._concatenate(arrays)
+
+    def load_arrays(self, times, prices, amounts, copy=True):
+        """Import database from arrays.
+
+        Args:
+            times: unix time stamps, sorted and without duplicates
+            prices: energy prices
+            amounts: energy amounts
+            copy (bool): ignored, data is always copied to partitions
+
+        Returns:
+            Nothing.
+        """
+        self.clear()
+        times = np.asarray(times, dtype=np.int64)
+        for month, start, end in _split_by_month(times):
+            self._months.add(month)
+            self._partitions[month] = ColumnarDatabase.from_arrays(
+                times[start:end], prices[start:end], amounts[start:end]
+            )
+            self._dirty.add(month)
+            self._evict()
+        self._touch()
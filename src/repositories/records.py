@@ -0,0 +1,335 @@
+from collections import OrderedDict
+import bisect
+import datetime
+import math
+from dateutil.tz import tzutc
+import numpy as np
+from entities import Record
+from .database import AbstractDatabase
+from .arrays import _find_range, _same, _to_datetime
+
+
+class Database(AbstractDatabase):
+    """Database to contain and manipulate records.
+
+    The basic implementation of database adds functionality to manipulate a
+    group of records. They can be added and exported to pandas DataFrame. Pandas
+    can then be used to save/load database in various formats. This
+    implementation uses csv file format for now, but basically it could also be
+    easily replaced with SQL database or some other "real" data format.
+
+    Typical usage example:
+
+    >>> db = Database()
+    >>> db.add_record(record1)
+    >>> db.add_record(record2)
+    >>> db.save("db.csv")
+
+    Attributes:
+        records: The list of records in database.
+    """
+
+    def __init__(self, records=None):
+        """Construct a new Database object.
+
+        Args:
+            records (OrderedDict, optional): initial data
+
+        Returns:
+            A new Database object.
+        """
+        super().__init__()
+        self._records = OrderedDict(sorted((records or {}).items()))
+        self._index = list(self._records)
+
+    def has_record(self, record):
+        """Tests does record already exist in database.
+
+        Args:
+            record: a record object to test.
+
+        Returns:
+            boolean
+        """
+        return record.get_time() in self._records
+
+    def add_record(self, record):
+        """Add new record to database.
+
+        Args:
+            record: a Record object to add.
+
+        Raises:
+            KeyError, if a record with the same time already exists
+
+        Returns:
+            boolean tuple (has_price, has_amount)
+        """
+        if self.has_record(record):
+            raise KeyError(f"Record {record.get_time()} already exists!")
+        time = record.get_time()
+        self._records[time] = record
+        if not self._index or self._index[-1] < time:
+            self._index.append(time)
+        else:
+            # out-of-order insert, move the records after it to the end
+            position = bisect.bisect_left(self._index, time)
+            self._index.insert(position, time)
+            for key in self._index[position + 1 :]:
+                self._records.move_to_end(key)
+        self._touch(int(time.timestamp()))
+        return (record.has_price(), record.has_amount())
+
+    def get_record(self, time):
+        """Return a record from database.
+
+        Args:
+            time: string or datetime representing time.
+
+        Raises:
+            KeyError, if record not found.
+
+        Returns:
+            Record
+        """
+        return self._records[_to_datetime(time)]
+
+    def update_record(self, record):
+        """Update record to database.
+
+        Args:
+            record: a record to update.
+
+        Raises:
+            KeyError, if record with timestamp not found
+
+        Returns:
+            boolean tuple (price_updated, amount_updated)
+
+        Notes:
+            If record price/value contains float('nan'), it won't get updated.
+        """
+        if not self.has_record(record):
+            raise KeyError(f"Record {record.get_time()} does not exist!")
+        price = record.get_price()
+        amount = record.get_amount()
+        if math.isnan(price):
+            price = None
+        if math.isnan(amount):
+            amount = None
+        time = record.get_time()
+        updated = self._records[time].update(price=price, amount=amount)
+        if any(updated):
+            self._touch(int(time.timestamp()))
+        return updated
+
+    def _upsert_arrays(self, times, prices, amounts, overwrite=False):
+        """Merge sorted arrays without duplicate times to the database.
+
+        If overwrite is True, nan values also replace existing values.
+
+        Returns:
+            tuple of boolean arrays (added, price_updated, amount_updated)
+
+        Notes:
+            Existing records are updated in place. New records are appended
+            to the index if they are newer than the others, otherwise the
+            records are sorted once after the whole batch.
+        """
+        added, price_updated, amount_updated = (
+            np.zeros(len(times), dtype=bool) for _ in range(3)
+        )
+        new = []
+        rows = zip(times.tolist(), prices.tolist(), amounts.tolist())
+        for i, (epoch, price, amount) in enumerate(rows):
+            time = datetime.datetime.fromtimestamp(epoch, tzutc())
+            if time in self._records and overwrite:
+                record = self._records[time]
+                price_updated[i] = not _same(record.get_price(), price)
+                amount_updated[i] = not _same(record.get_amount(), amount)
+                if price_updated[i] or amount_updated[i]:
+                    self._records[time] = Record.from_epoch(epoch, price, amount)
+            elif time in self._records:
+                # like in _merge_arrays, only nan is missing, zero is a value
+                record = self._records[time]
+                price_updated[i] = not math.isnan(price) and not _same(
+                    record.get_price(), price
+                )
+                amount_updated[i] = not math.isnan(amount) and not _same(
+                    record.get_amount(), amount
+                )
+                if price_updated[i] or amount_updated[i]:
+                    self._records[time] = Record.from_epoch(
+                        epoch,
+                        price if price_updated[i] else record.get_price(),
+                        amount if amount_updated[i] else record.get_amount(),
+                    )
+            else:
+                record = Record.from_epoch(epoch, price, amount)
+                self._records[time] = record
+                new.append(time)
+                added[i] = True
+                price_updated[i], amount_updated[i] = (
+                    record.has_price(),
+                    record.has_amount(),
+                )
+        if new and self._index and new[0] < self._index[-1]:
+            self.sort_records()
+        else:
+            self._index.extend(new)
+        changed = np.flatnonzero(added | price_updated | amount_updated)
+        if len(changed) > 0:
+            self._touch(int(times[changed[0]]))
+        return (added, price_updated, amount_updated)
+
+    def load_arrays(self, times, prices, amounts, copy=True):
+        """Import database from arrays.
+
+        Args:
+            times: unix time stamps, sorted and without duplicates
+            prices: energy prices
+            amounts: energy amounts
+            copy (bool): ignored, records are always created
+
+        Returns:
+            Nothing.
+        """
+        records = map(
+            Record.from_epoch,
+            np.asarray(times, dtype=np.int64).tolist(),
+            np.asarray(prices, dtype=float).tolist(),
+            np.asarray(amounts, dtype=float).tolist(),
+        )
+        self._records = OrderedDict((record.get_time(), record) for record in records)
+        self._index = list(self._records)
+        self._touch()
+
+    def sort_records(self):
+        """Sort records in-place.
+
+        Args:
+            Nothing.
+
+        Returns:
+            Nothing.
+
+        Notes:
+            Records are kept sorted when they are added, so there is usually
+            no need to call this.
+        """
+        self._records = OrderedDict(sorted(self._records.items()))
+        self._index = list(self._records)
+
+    def get_records(self):
+        """Get all records from the database as a sorted ordered dictionary.
+
+        Args:
+            Nothing.
+
+        Returns:
+            A list of records.
+
+        Notes:
+            Records are kept sorted when they are added: appending a record
+            newer than the others is O(1), and an older record is put in
+            place using binary search, so this doesn't need to sort anything.
+        """
+        return self._records
+
+    def get_index(self):
+        """Return sorted list of the times of the records.
+
+        Args:
+            Nothing.
+
+        Returns:
+            A list of datetimes.
+        """
+        return self._index
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time.
+
+        Args:
+            start (string or datetime)
+            end (string or datetime, optional)
+
+        Returns:
+            A read-only DatabaseView s.t. start <= records <= end
+
+        Notes:
+            Range is found with binary search from the sorted index, so the
+            cost depends only on the size of the result, not on the size of
+            the database. Records are not copied.
+        """
+        index = self.get_index()
+        first, last = _find_range(index, start, end)
+        return DatabaseView(self._records, index[first:last])
+
+    def clear(self):
+        """Removes all records from a database."""
+        self._records = OrderedDict()
+        self._index = []
+        self._touch()
+
+
+class DatabaseView(AbstractDatabase):
+    """Read-only view to a time range of a Database.
+
+    View is returned from `Database.filter_by_time`. It shares the records
+    with the database, so it is cheap to create. Changes in the values of
+    the records are visible in the view, but records added to the database
+    afterwards are not. Therefore, DataFrame export of a view is not cached.
+    """
+
+    dataframe_cache_limit = 0
+
+    def __init__(self, records, keys):
+        """Construct a new DatabaseView object.
+
+        Args:
+            records: mapping from time to Record
+            keys: sorted list of times included in the view
+
+        Returns:
+            A new DatabaseView object.
+        """
+        super().__init__()
+        self._records = records
+        self._keys = keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def has_record(self, record):
+        """Tests does record exist in the view."""
+        first, last = _find_range(self._keys, record.get_time(), record.get_time())
+        return first < last
+
+    def get_record(self, time):
+        """Return a record from the view.
+
+        Raises:
+            KeyError, if record not found.
+        """
+        first, last = _find_range(self._keys, time, time)
+        if first == last:
+            raise KeyError(time)
+        return self._records[self._keys[first]]
+
+    def get_records(self):
+        """Get all records from the view as a sorted ordered dictionary."""
+        return OrderedDict((key, self._records[key]) for key in self._keys)
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time, returns a new DatabaseView."""
+        first, last = _find_range(self._keys, start, end)
+        return DatabaseView(self._records, self._keys[first:last])
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("DatabaseView is read-only")
+
+    add_record = _read_only
+    update_record = _read_only
+    load_arrays = _read_only
+    clear = _read_only
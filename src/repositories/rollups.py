@@ -0,0 +1,197 @@
+import datetime
+from dateutil.tz import gettz
+import numpy as np
+import pandas as pd
+
+
+def get_local_days(times, timezone):
+    """Return local dates of unix time stamps.
+
+    Args:
+        times: unix time stamps
+        timezone (str): time zone, e.g. 'Europe/Helsinki'
+
+    Returns:
+        numpy array of datetime64[D]
+    """
+    local = pd.to_datetime(np.asarray(times).astype("datetime64[s]"), utc=True)
+    local = local.tz_convert(timezone).tz_localize(None)
+    return local.values.astype("datetime64[D]")
+
+
+class Rollups:
+    """Daily and monthly aggregates of the data of a database.
+
+    For each day and month (in local time), the number of records, total
+    consumption, total cost and consumption with a known price is kept.
+    Consumption-weighted average price is cost divided by consumption with a
+    known price.
+
+    Aggregates are computed once from the whole database. After that, the
+    database tells which times are modified, and only the days containing
+    them are aggregated again from the database, when rollups are queried
+    next time. Months are updated with the difference of the old and the new
+    aggregates of those days, so the cost of a query depends on the number
+    of modified days, not on the size of the database.
+
+    Typical usage example:
+
+    >>> rollups = Rollups()
+    >>> rollups.get_daily(db)
+    >>> rollups.invalidate(time)
+    >>> rollups.get_monthly(db, "2022-01", "2022-12")
+    """
+
+    def __init__(self, timezone="Europe/Helsinki"):
+        """Construct a new Rollups object.
+
+        Args:
+            timezone (str, optional): time zone of the days and months
+
+        Returns:
+            A new Rollups object.
+        """
+        self._timezone = timezone
+        self._tzinfo = gettz(timezone)
+        self._days = None
+        self._months = None
+        self._dirty = set()
+
+    def invalidate(self, epoch=None):
+        """Mark data of a time modified.
+
+        Args:
+            epoch (int, optional): unix time stamp, by default everything is
+                computed again
+
+        Returns:
+            Nothing.
+        """
+        if epoch is None:
+            self._days = None
+            self._months = None
+            self._dirty = set()
+        elif self._days is not None:
+            date = datetime.datetime.fromtimestamp(epoch, self._tzinfo).date()
+            self._dirty.add(np.datetime64(date, "D"))
+
+    def invalidate_many(self, epochs):
+        """Mark data of many times modified.
+
+        Args:
+            epochs: unix time stamps
+
+        Returns:
+            Nothing.
+        """
+        if self._days is not None and len(epochs) > 0:
+            self._dirty.update(np.unique(get_local_days(epochs, self._timezone)))
+
+    def _aggregate(self, times, prices, amounts):
+        """Aggregate arrays to days.
+
+        Returns:
+            DataFrame indexed by date.
+        """
+        has_amount = np.isfinite(amounts)
+        priced = has_amount & np.isfinite(prices)
+        frame = pd.DataFrame(
+            {
+                "records": np.ones(len(times)),
+                "consumption": np.where(has_amount, amounts, 0.0),
+                "cost": np.where(priced, prices * amounts, 0.0),
+                "priced_consumption": np.where(priced, amounts, 0.0),
+            },
+            index=get_local_days(times, self._timezone).astype("datetime64[ns]"),
+        )
+        return frame.groupby(level=0).sum()
+
+    @staticmethod
+    def _to_months(days):
+        """Sum daily aggregates to months."""
+        months = days.index.values.astype("datetime64[M]").astype("datetime64[ns]")
+        return days.groupby(months).sum()
+
+    def _epoch(self, day):
+        """Return unix time stamp of local midnight of a date."""
+        midnight = datetime.datetime.combine(
+            day.astype(object), datetime.time(), self._tzinfo
+        )
+        return int(midnight.timestamp())
+
+    def _refresh(self, database):
+        """Aggregate modified days again."""
+        if self._days is None:
+            self._days = self._aggregate(*database.to_arrays())
+            self._months = self._to_months(self._days)
+            return
+        if not self._dirty:
+            return
+        dirty = np.array(sorted(self._dirty))
+        self._dirty = set()
+        # aggregate each run of consecutive days with one query
+        runs = np.split(
+            dirty, np.flatnonzero(np.diff(dirty) > np.timedelta64(1, "D")) + 1
+        )
+        new = [
+            self._aggregate(
+                *database.filter_by_time(
+                    self._epoch(run[0]), self._epoch(run[-1] + 1) - 1
+                ).to_arrays()
+            )
+            for run in runs
+        ]
+        new = pd.concat(new)
+        modified = np.isin(self._days.index.values, dirty.astype("datetime64[ns]"))
+        old = self._days[modified]
+        self._months = self._months.sub(self._to_months(old), fill_value=0.0)
+        self._months = self._months.add(self._to_months(new), fill_value=0.0)
+        self._months = self._months[self._months["records"] > 0]
+        days = self._days[~modified]
+        self._days = pd.concat([days, new]).sort_index()
+
+    @staticmethod
+    def _summarize(aggregates, start, end, name):
+        """Return aggregates between start and end in the public format."""
+        aggregates = aggregates.loc[start:end]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            price = aggregates["cost"] / aggregates["priced_consumption"]
+        summary = pd.DataFrame(
+            {
+                "consumption": aggregates["consumption"],
+                "cost": aggregates["cost"],
+                "price": price.where(aggregates["priced_consumption"] > 0),
+            }
+        )
+        summary.index.name = name
+        return summary
+
+    def get_daily(self, database, start=None, end=None):
+        """Return daily aggregates of a database.
+
+        Args:
+            database: database, whose data has been aggregated
+            start (str or datetime, optional): first day to include
+            end (str or datetime, optional): last day to include
+
+        Returns:
+            Pandas DataFrame indexed by local date, with columns consumption
+            (kWh), cost and consumption-weighted average price.
+        """
+        self._refresh(database)
+        return self._summarize(self._days, start, end, "date")
+
+    def get_monthly(self, database, start=None, end=None):
+        """Return monthly aggregates of a database.
+
+        Args:
+            database: database, whose data has been aggregated
+            start (str or datetime, optional): first month to include
+            end (str or datetime, optional): last month to include
+
+        Returns:
+            Pandas DataFrame indexed by the first day of the month, with
+            columns like in `get_daily`.
+        """
+        self._refresh(database)
+        return self._summarize(self._months, start, end, "month")
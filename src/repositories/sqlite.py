@@ -0,0 +1,311 @@
+import math
+import sqlite3
+import numpy as np
+from entities import Record
+from .database import AbstractDatabase
+from .arrays import _merge_arrays
+from .columnar import ColumnarDatabase, RecordsView, to_epoch
+
+
+class SqliteDatabase(AbstractDatabase):
+    """Database storing records in a SQLite database.
+
+    Records are stored in a single table, where time (unix time stamp) is the
+    primary key, so lookups and range queries use the index and touch only
+    the rows they need. The database is opened in WAL mode, so the user
+    interfaces can read it while another process is updating it.
+
+    Changes are not committed one by one. Any number of additions and updates
+    are collected to one transaction, which is committed with `commit`.
+    Missing values (nan) are stored as NULL.
+
+    Typical usage example:
+
+    >>> db = SqliteDatabase("db.sqlite")
+    >>> db.add_or_update_record(record1)
+    >>> db.add_or_update_record(record2)
+    >>> db.commit()
+    >>> db.filter_by_time("2022-12-24 00:00", "2022-12-24 23:00").to_dataframe()
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS records ("
+        "time INTEGER PRIMARY KEY, price REAL, amount REAL)"
+    )
+
+    def __init__(self, filename=":memory:"):
+        """Construct a new SqliteDatabase object.
+
+        Args:
+            filename (str, optional): database file, by default database is
+                kept in memory
+
+        Returns:
+            A new SqliteDatabase object.
+        """
+        super().__init__()
+        self._filename = None
+        self._connection = None
+        self.connect(filename)
+
+    def connect(self, filename):
+        """Connect to a database file.
+
+        Args:
+            filename (str): database file
+
+        Returns:
+            Nothing.
+
+        Notes:
+            Uncommitted changes of the current connection are committed first.
+        """
+        self.close()
+        self._filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(self.schema)
+        self._connection.commit()
+        self._touch()
+
+    def get_filename(self):
+        """Return file name of the database."""
+        return self._filename
+
+    def commit(self):
+        """Commit changes to the database file."""
+        self._connection.commit()
+
+    def close(self):
+        """Commit changes and close the connection."""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _execute(self, sql, parameters=()):
+        return self._connection.execute(sql, parameters)
+
+    @staticmethod
+    def _to_arrays(rows):
+        """Convert (time, price, amount) rows to arrays, NULL to nan."""
+        data = np.array(rows, dtype=float).reshape(-1, 3)
+        return (data[:, 0].astype(np.int64), data[:, 1], data[:, 2])
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def has_record(self, record):
+        """Tests does record already exist in database.
+
+        Args:
+            record: a record object to test.
+
+        Returns:
+            boolean
+        """
+        epoch = record.get_epoch()
+        cursor = self._execute("SELECT 1 FROM records WHERE time = ?", (epoch,))
+        return cursor.fetchone() is not None
+
+    def add_record(self, record):
+        """Add new record to database.
+
+        Args:
+            record: a Record object to add.
+
+        Raises:
+            KeyError, if a record with the same time already exists
+
+        Returns:
+            boolean tuple (has_price, has_amount)
+        """
+        epoch = record.get_epoch()
+        try:
+            self._execute(
+                "INSERT INTO records VALUES (?, ?, ?)",
+                (epoch, record.get_price(), record.get_amount()),
+            )
+        except sqlite3.IntegrityError as err:
+            raise KeyError(f"Record {record.get_time()} already exists!") from err
+        self._touch(epoch)
+        return (record.has_price(), record.has_amount())
+
+    def get_record(self, time):
+        """Return a record from database.
+
+        Args:
+            time: string or datetime representing time.
+
+        Raises:
+            KeyError, if record not found.
+
+        Returns:
+            Record
+        """
+        cursor = self._execute(
+            "SELECT time, price, amount FROM records WHERE time = ?",
+            (to_epoch(time),),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError(time)
+        epoch, price, amount = row
+        return Record.from_epoch(
+            epoch,
+            float("nan") if price is None else price,
+            float("nan") if amount is None else amount,
+        )
+
+    def update_record(self, record):
+        """Update record to database.
+
+        Args:
+            record: a record to update.
+
+        Raises:
+            KeyError, if record with timestamp not found
+
+        Returns:
+            boolean tuple (price_updated, amount_updated)
+
+        Notes:
+            If record price/value contains float('nan'), it won't get updated.
+        """
+        old = self.get_record(record.get_time())
+        updated = []
+        for new_value, old_value in (
+            (record.get_price(), old.get_price()),
+            (record.get_amount(), old.get_amount()),
+        ):
+            updated.append(not math.isnan(new_value) and new_value != old_value)
+        if any(updated):
+            self._execute(
+                "UPDATE records SET price = COALESCE(?, price), "
+                "amount = COALESCE(?, amount) WHERE time = ?",
+                (
+                    record.get_price(),
+                    record.get_amount(),
+                    record.get_epoch(),
+                ),
+            )
+            self._touch(record.get_epoch())
+        return tuple(updated)
+
+    def _upsert_arrays(self, times, prices, amounts, overwrite=False):
+        """Merge sorted arrays without duplicate times to the database.
+
+        If overwrite is True, nan values also replace existing values.
+
+        Returns:
+            tuple of boolean arrays (added, price_updated, amount_updated)
+
+        Notes:
+            Existing rows in the time range of the batch are read with one
+            query, and only the changed rows are written with one upsert
+            statement.
+        """
+        rows = []
+        if len(times) > 0:
+            rows = self._execute(
+                "SELECT time, price, amount FROM records "
+                "WHERE time BETWEEN ? AND ? ORDER BY time",
+                (int(times[0]), int(times[-1])),
+            ).fetchall()
+        _, added, price_updated, amount_updated = _merge_arrays(
+            self._to_arrays(rows), (times, prices, amounts), overwrite
+        )
+        changed = np.flatnonzero(added | price_updated | amount_updated)
+        update = (
+            "price = excluded.price, amount = excluded.amount"
+            if overwrite
+            else "price = COALESCE(excluded.price, price), "
+            "amount = COALESCE(excluded.amount, amount)"
+        )
+        self._connection.executemany(
+            "INSERT INTO records VALUES (?, ?, ?) ON CONFLICT(time) DO UPDATE SET "
+            + update,
+            zip(
+                times[changed].tolist(),
+                prices[changed].tolist(),
+                amounts[changed].tolist(),
+            ),
+        )
+        if len(changed) > 0:
+            self._touch(int(times[changed[0]]))
+        return (added, price_updated, amount_updated)
+
+    def get_records(self):
+        """Get all records from the database as a sorted mapping.
+
+        Args:
+            Nothing.
+
+        Returns:
+            RecordsView, a mapping from time to Record.
+        """
+        return RecordsView(*self.to_arrays())
+
+    def filter_by_time(self, start, end=None):
+        """Filter records by time.
+
+        Args:
+            start (string or datetime)
+            end (string or datetime, optional)
+
+        Returns:
+            A new in-memory database s.t. start <= records <= end
+        """
+        sql = "SELECT time, price, amount FROM records WHERE time >= ?"
+        parameters = [to_epoch(start)]
+        if end is not None:
+            sql += " AND time <= ?"
+            parameters.append(to_epoch(end))
+        rows = self._execute(sql + " ORDER BY time", parameters).fetchall()
+        return ColumnarDatabase.from_arrays(*self._to_arrays(rows))
+
+    def clear(self):
+        """Removes all records from a database."""
+        self._execute("DELETE FROM records")
+        self._touch()
+
+    def to_arrays(self):
+        """Export database to arrays.
+
+        Args:
+            Nothing.
+
+        Returns:
+            tuple (times, prices, amounts), where times are unix time stamps.
+        """
+        rows = self._execute(
+            "SELECT time, price, amount FROM records ORDER BY time"
+        ).fetchall()
+        return self._to_arrays(rows)
+
+    def load_arrays(self, times, prices, amounts, copy=True):
+        """Import database from arrays.
+
+        Args:
+            times: unix time stamps, sorted and without duplicates
+            prices: energy prices
+            amounts: energy amounts
+            copy (bool): ignored, data is always copied to the database
+
+        Returns:
+            Nothing.
+
+        Notes:
+            All rows are inserted in one transaction.
+        """
+        self.clear()
+        self._connection.executemany(
+            "INSERT INTO records VALUES (?, ?, ?)",
+            zip(
+                np.asarray(times, dtype=np.int64).tolist(),
+                np.asarray(prices, dtype=float).tolist(),
+                np.asarray(amounts, dtype=float).tolist(),
+            ),
+        )
+        self._touch()
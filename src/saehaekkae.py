@@ -25,58 +25,111 @@ from apiclient.discovery import build
 
 import config
 from services import DataService, DateTimePicker, MessageService
+from entities import HttpCache
 from ui import TUI, GUI
 
 
-def update_sources(dataservice):
-    """Update sources."""
-    print("Updating prices")
+def create_dataservice():
+    """Create DataService and load database from disk."""
+    dataservice = DataService(
+        engine=config.DB_ENGINE, journal_limit=config.DB_JOURNAL_LIMIT
+    )
+    if os.path.exists(config.DB_FILE):
+        dataservice.load_db(config.DB_FILE)
+    return dataservice
+
+
+def _get_price_sources(dataservice):
+    """Return price source to update, unless all published prices are stored."""
     source_name = config.ENERGY_PRICE_SOURCE
-    source = dataservice.get_source(source_name)
-    price, amount = dataservice.update_db(source)
-    print(f"Updated {price} price information")
+    if not dataservice.is_price_update_needed(
+        areas=config.PRICE_AREAS, publication=config.PRICE_PUBLICATION_TIME
+    ):
+        print("Prices are up to date, not fetching")
+        return []
+    options = {}
+    if source_name == "spot-hinta.fi":
+        options["areas"] = config.PRICE_AREAS
+        options["cache"] = HttpCache(config.HTTP_CACHE_DIR, config.HTTP_CACHE_TTL)
+    return [(source_name, options, config.PRICE_UPDATE_TIMEOUT)]
+
+
+def _get_consumption_sources():
+    """Return consumption source to update, if the consumption file exists."""
     source_name = config.ENERGY_CONSUMPTION_SOURCE
     local_file = config.ENERGY_CONSUMPTION_FILE
-    if os.path.exists(local_file):
-        source = dataservice.get_source(source_name, local_file=local_file)
-        price, amount = dataservice.update_db(source)
-        print(f"Updated {amount} consumption information from local file {local_file}")
-    else:
+    if not os.path.exists(local_file):
         print(f"Failed to update consumption: file {local_file} does not exist")
+        return []
+    options = {"local_file": local_file}
+    if source_name == "datahub":
+        options["checkpoint_file"] = f"{local_file}.checkpoint"
+    return [(source_name, options, None)]
+
+
+def update_sources(dataservice):
+    """Update prices and consumption from all sources at the same time.
+
+    Returns:
+        A list of results, see `DataService.update_db_concurrently`.
+    """
+    sources = _get_price_sources(dataservice) + _get_consumption_sources()
+    if not sources:
+        return []
+    print(f"Updating from {', '.join(source[0] for source in sources)}")
+    results = dataservice.update_db_concurrently(sources, timeout=config.UPDATE_TIMEOUT)
+    for result in results:
+        if result["status"] == "ok":
+            price, amount = result["updated"]
+            print(
+                f"Updated {price} prices and {amount} consumptions from {result['source']}"
+            )
+        elif result["status"] == "timeout":
+            print(f"Failed to update from {result['source']}: deadline exceeded")
+        else:
+            print(f"Failed to update from {result['source']}: {result['error']}")
+    return results
 
 
 def update_db(args):
     """Update database."""
     print("Update database")
-    dataservice = DataService()
-    if os.path.exists(config.DB_FILE):
-        dataservice.load_db(config.DB_FILE)
-    update_sources(dataservice)
+    dataservice = create_dataservice()
+    results = update_sources(dataservice)
     dataservice.save_db(config.DB_FILE)
+    # rows read by the sources are skipped next time only when they are saved
+    for result in results:
+        if hasattr(result["instance"], "save_checkpoint"):
+            result["instance"].save_checkpoint()
+
+
+def compact_db(_args):
+    """Write database journal to database file."""
+    print("Compact database")
+    dataservice = create_dataservice()
+    dataservice.compact_db(config.DB_FILE)
 
 
 def start_tui(args):
     """Saehaekkae textual user interface starting command."""
     print("Saehaekkae -- starting textual user interface")
-    dataservice = DataService()
-    if os.path.exists(config.DB_FILE):
-        dataservice.load_db(config.DB_FILE)
+    dataservice = create_dataservice()
     if not args.no_update:
         update_sources(dataservice)
-    datetimepicker = DateTimePicker()
+    datetimepicker = DateTimePicker(resolution=dataservice.get_resolution())
     messageservice = MessageService()
-    return TUI(dataservice, datetimepicker, messageservice).mainloop()
+    return TUI(
+        dataservice, datetimepicker, messageservice, area=config.PRICE_AREA
+    ).mainloop()
 
 
 def start_gui(args):
     """Saehaekkae graphical user interface starting command."""
     print("Saehaekkae -- starting graphical user interface")
-    dataservice = DataService()
-    if os.path.exists(config.DB_FILE):
-        dataservice.load_db(config.DB_FILE)
+    dataservice = create_dataservice()
     if not args.no_update:
         update_sources(dataservice)
-    datetimepicker = DateTimePicker()
+    datetimepicker = DateTimePicker(resolution=dataservice.get_resolution())
     messageservice = MessageService()
     return GUI(dataservice, datetimepicker, messageservice).mainloop()
 
@@ -108,6 +161,7 @@ def main():
     tui = subparsers.add_parser("tui", help="Start textual user interface")
     auth = subparsers.add_parser("auth", help="Authenticate to Google calendar API")
     update = subparsers.add_parser("update", help="Update database")
+    compact = subparsers.add_parser("compact", help="Compact database journal")
 
     parser.add_argument(
         "--no-update",
@@ -122,6 +176,7 @@ def main():
     tui.set_defaults(func=start_tui)
     auth.set_defaults(func=google_auth)
     update.set_defaults(func=update_db)
+    compact.set_defaults(func=compact_db)
     args = parser.parse_args()
     return args.func(args)
 
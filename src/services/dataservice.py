@@ -1,7 +1,28 @@
+import os
+from warnings import warn
 import datetime
-
-from repositories import Database
-from entities import Selection, PriceSource, ConsumptionSource, GenericSource
+from time import monotonic
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import gzip
+import lzma
+from dateutil.tz import gettz
+import numpy as np
+
+from repositories import (
+    Database,
+    ColumnarDatabase,
+    SqliteDatabase,
+    PartitionedDatabase,
+    Journal,
+)
+from entities import (
+    Record,
+    Selection,
+    PriceSource,
+    ConsumptionSource,
+    GenericSource,
+    run_in_daemon,
+)
 
 
 class DataService:
@@ -19,27 +40,169 @@ class DataService:
     >>> print(selection)
     ...
 
+    The storage engine of the database can be chosen by name, 'records'
+    (default) keeps a Record object per hour and 'columnar' stores data in
+    NumPy arrays, which is more efficient for a long history. With 'sqlite',
+    a '.sqlite' database file is used directly instead of loading it to
+    memory, and with 'partitioned', a '.parts' directory of monthly partitions
+    is used, loading only the partitions which are needed.
+
+    >>> ds = DataService(engine="columnar")
+
     """
 
-    def __init__(self, database=None):
-        self._db = database or Database()
+    def __init__(self, database=None, engine="records", journal_limit=0):
+        """Construct a new DataService object.
+
+        Args:
+            database (optional): database to use
+            engine (str, optional): name of the storage engine if database is
+                not given
+            journal_limit (int, optional): if positive, `save_db` appends only
+                changed records to a journal, and the database is compacted
+                when the journal has more than `journal_limit` entries.
+
+        Returns:
+            A new DataService object.
+        """
+        self._engines = {
+            "records": Database,
+            "columnar": ColumnarDatabase,
+            "sqlite": SqliteDatabase,
+            "partitioned": PartitionedDatabase,
+        }
+        # file formats, which are used directly by a database engine
+        self._stores = {".sqlite": SqliteDatabase, ".parts": PartitionedDatabase}
+        # compressed csv files
+        self._compressions = {".gz": gzip.open, ".xz": lzma.open}
+        if engine not in self._engines:
+            raise KeyError(f"Unable to create database: unknown engine {engine}")
+        self._db = self._engines[engine]() if database is None else database
+        self._journal_limit = journal_limit
+        # changes are needed only for the journal
+        self._db.track_changes(journal_limit > 0)
         self._sources = {
             "spot-hinta.fi": PriceSource,
             "datahub": ConsumptionSource,
             "json": GenericSource,
         }
 
+    @staticmethod
+    def get_journal(dbfile):
+        """Return journal of a database file."""
+        return Journal(f"{dbfile}.journal")
+
+    def _get_store(self, dbfile):
+        """Return database class using the file directly, or None."""
+        for extension, store in self._stores.items():
+            if dbfile.endswith(extension):
+                return store
+        return None
+
+    def _open_csv(self, dbfile, mode):
+        """Open csv file in text mode, compressed if it has such an extension."""
+        for extension, open_ in self._compressions.items():
+            if dbfile.endswith(extension):
+                return open_(dbfile, f"{mode}t", encoding="utf-8")
+        return open(dbfile, mode, encoding="utf-8")
+
+    def _has_extra_columns(self):
+        """Return whether database has sites or other than default areas."""
+        return bool(self._db.get_sites()) or len(self._db.get_areas()) > 1
+
+    def _is_csv(self, dbfile):
+        """Return whether database file is in csv format."""
+        return self._get_store(dbfile) is None and not dbfile.endswith(".bin")
+
+    def _is_connected(self, dbfile):
+        """Return whether database is using the file directly."""
+        store = self._get_store(dbfile)
+        return (
+            store is not None
+            and isinstance(self._db, store)
+            and os.path.abspath(self._db.get_filename()) == os.path.abspath(dbfile)
+        )
+
+    def _write_db(self, dbfile):
+        """Write the whole database to a file."""
+        store = self._get_store(dbfile)
+        if store is not None:
+            if self._is_connected(dbfile):
+                self._db.commit()
+                return
+            database = store(dbfile)
+            database.load_arrays(*self._db.to_arrays())
+            database.close()
+            return
+        if dbfile.endswith(".bin"):
+            tmpfile = f"{dbfile}.tmp"
+            with open(tmpfile, "wb") as out:
+                self._db.write_binary(out)
+            os.replace(tmpfile, dbfile)
+            return
+        with self._open_csv(dbfile, "w") as out:
+            self._db.write_csv(out)
+
     def save_db(self, dbfile):
-        """Save database to disk in a csv file format.
+        """Save database to disk.
 
         Args:
             dbfile: file name of database
 
         Returns:
             Nothing.
+
+        Notes:
+            File format is selected by the file extension: '.bin' is the binary
+            format (see `repositories.binary`), '.sqlite' is a SQLite
+            database, '.parts' is a directory of monthly partitions, otherwise
+            csv format is used. Csv files ending with '.gz' or '.xz' (e.g.
+            'db.csv.gz') are compressed with gzip or xz. Compressed files are
+            written and read as streams, so the whole text is never in memory.
+            Binary file is written to a temporary file first and then renamed,
+            so that other processes having the old file mapped are not
+            affected. Consumption of sites and prices of other bidding areas
+            than the default are saved only in csv format.
+
+            In journal mode, changes since the last load or save are appended
+            to the journal `<dbfile>.journal` instead of rewriting the database
+            file, unless the journal grows over the limit or some values
+            have been cleared, which the journal can't express. SQLite databases
+            and partitions are always updated incrementally and don't use a
+            journal.
         """
-        with open(dbfile, "w", encoding="utf-8") as out:
-            self._db.write_csv(out)
+        journal = self.get_journal(dbfile)
+        if self._has_extra_columns() and not self._is_csv(dbfile):
+            warn(f"sites and areas are not saved to {dbfile}, only default columns")
+        if self._get_store(dbfile) is not None:
+            self._write_db(dbfile)
+            self._db.clear_changes()
+            return
+        # journal doesn't have consumption of sites, prices of areas or
+        # cleared values
+        if (
+            self._journal_limit > 0
+            and os.path.exists(dbfile)
+            and not self._has_extra_columns()
+            and not self._db.has_cleared_values()
+        ):
+            journal.append(self._db.pop_changes())
+            if len(journal) <= self._journal_limit:
+                return
+        self.compact_db(dbfile)
+
+    def compact_db(self, dbfile):
+        """Write the whole database to disk and remove the journal.
+
+        Args:
+            dbfile: file name of database
+
+        Returns:
+            Nothing.
+        """
+        self._write_db(dbfile)
+        self.get_journal(dbfile).remove()
+        self._db.clear_changes()
 
     def load_db(self, dbfile):
         """Read database from disk.
@@ -51,11 +214,49 @@ class DataService:
             Nothing.
 
         Notes:
-            Removes all existing data before loading.
+            Removes all existing data before loading. File format is selected
+            by the file extension like in `save_db`. Binary files are
+            memory-mapped read-only, which makes opening them almost free.
+            If the database has a journal, it is replayed after loading.
+
+            If the database engine is 'sqlite' or 'partitioned', a '.sqlite'
+            file or a '.parts' directory is not loaded but connected to, and
+            queries are run against it.
         """
+        store = self._get_store(dbfile)
+        if store is not None and isinstance(self._db, store):
+            self._db.connect(dbfile)
+            return
         self._db.clear()
-        with open(dbfile, "r", encoding="utf-8") as file:
-            self._db.read_csv(file)
+        if store is not None:
+            database = store(dbfile)
+            self._db.load_arrays(*database.to_arrays())
+            database.close()
+        elif dbfile.endswith(".bin"):
+            with open(dbfile, "rb") as file:
+                self._db.read_binary(file)
+        else:
+            with self._open_csv(dbfile, "r") as file:
+                self._db.read_csv(file)
+        self.get_journal(dbfile).replay(self._db)
+        self._db.clear_changes()
+
+    def merge_db(self, dbfile, policy="prefer-non-nan"):
+        """Merge another database file to the database.
+
+        Args:
+            dbfile: file name of the database to merge, in any format
+                supported by `load_db`
+            policy (str, optional): conflict policy, 'prefer-left' (keep
+                existing data), 'prefer-right' (take data from the file) or
+                'prefer-non-nan' (take data from the file unless missing)
+
+        Returns:
+            dictionary of merge statistics, see `AbstractDatabase.merge`.
+        """
+        database = ColumnarDatabase()
+        DataService(database=database).load_db(dbfile)
+        return self._db.merge(database, policy)
 
     def add_source(self, source, source_class):
         """Add new source to update database.
@@ -100,44 +301,403 @@ class DataService:
         """
         return source.update(*args, **kwargs)
 
-    def get_data_as_dataframe(self):
-        """Return the whole database as a Pandas DataFrame for a serious data analysis."""
-        return self._db.to_dataframe()
+    def _create_staging(self):
+        """Return empty in-memory database able to store what this can."""
+        staging = ColumnarDatabase()
+        staging.supports_sites = self._db.supports_sites
+        staging.supports_areas = self._db.supports_areas
+        return staging
+
+    @staticmethod
+    def _merge_staging(target, staging):
+        """Merge staging database to target, including sites and areas.
+
+        Notes:
+            If staging has sites, its amount column is the total of its own
+            sites only, so it is not merged. Totals of the target are then
+            computed by `upsert_site_amounts` from the sites of the target.
+        """
+        times, prices, _ = staging.to_arrays()
+        sites = staging.get_site_amounts() if staging.get_sites() else None
+        areas = staging.get_area_prices()
+        if sites is not None:
+            # staging is not used after merging, so it is simply reloaded
+            staging.load_arrays(times, prices, np.full(len(times), np.nan))
+        stats = target.merge(staging)
+        if sites is not None:
+            for site in sites:
+                target.upsert_site_amounts(site, times, sites[site].to_numpy())
+        for area in areas.columns[1:]:
+            target.upsert_area_prices(area, times, areas[area].to_numpy())
+        return stats
+
+    def _update_staging(self, name, staging, options):
+        """Create a source updating a staging database and run it.
+
+        Returns:
+            tuple (source, return value of the update)
+        """
+        if name not in self._sources:
+            raise KeyError(f"Unable to update using source {name}: unknown source")
+        source = self._sources[name](staging, **options)
+        return (source, source.update())
+
+    @staticmethod
+    def _wait_staging(name, future, deadline):
+        """Wait for a source until a deadline, see `update_db_concurrently`.
+
+        Args:
+            name (str): name of the source
+            future: future of `_update_staging`
+            deadline (float): time.monotonic() value to wait until
+
+        Returns:
+            A result dictionary.
+        """
+        result = {
+            "source": name,
+            "status": "ok",
+            "updated": None,
+            "error": None,
+            "instance": None,
+        }
+        try:
+            remaining = max(0.0, deadline - monotonic())
+            result["instance"], result["updated"] = future.result(timeout=remaining)
+        except FuturesTimeoutError:
+            result["status"] = "timeout"
+        except Exception as err:  # pylint: disable=broad-except
+            result["status"] = "error"
+            result["error"] = err
+        return result
+
+    def update_db_concurrently(self, sources, timeout=30.0):
+        """Update database from many sources at the same time.
+
+        Args:
+            sources: a list of tuples (source, options, timeout), where source
+                is the name of the source, options is a dictionary of keyword
+                arguments to create the source (see `get_source`) and timeout
+                is the deadline of the source in seconds, None for the default
+            timeout (float, optional): default deadline of a source in seconds
+
+        Returns:
+            A list of dictionaries, one for each source, with keys 'source',
+            'status' ('ok', 'timeout' or 'error'), 'updated' (the return value
+            of the update, or None), 'error' (the exception, or None) and
+            'instance' (the source object, or None).
+
+        Notes:
+            Every source runs in its own thread and updates its own in-memory
+            staging database, so the sources don't block each other and the
+            time of the update is the time of the slowest source, not the
+            sum. When all sources are done or past their deadlines, staging
+            databases of the successful sources are combined and merged to the
+            database with one batch upsert. A source past its deadline is left
+            running in a daemon thread, so it doesn't keep the process from
+            exiting, and its data is discarded.
+        """
+        started = monotonic()
+        jobs = []
+        for name, options, deadline in sources:
+            staging = self._create_staging()
+            future = run_in_daemon(
+                self._update_staging, name, staging, options, name=f"update-{name}"
+            )
+            jobs.append((name, staging, future, deadline))
+        results = []
+        combined = self._create_staging()
+        for name, staging, future, deadline in jobs:
+            deadline = started + (timeout if deadline is None else deadline)
+            result = self._wait_staging(name, future, deadline)
+            if result["status"] == "ok":
+                self._merge_staging(combined, staging)
+            results.append(result)
+        self._merge_staging(self._db, combined)
+        return results
+
+    def get_data_as_dataframe(self, start=None, end=None):
+        """Return the database as a Pandas DataFrame for a serious data analysis.
+
+        Args:
+            start (str or datetime, optional): first time to include
+            end (str or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame object.
+
+        Notes:
+            DataFrame is cached by the database until the data changes, so it
+            must not be modified in place.
+        """
+        return self._db.to_dataframe(start, end)
+
+    def get_daily_summary(self, start=None, end=None):
+        """Return daily consumption, cost and consumption-weighted average price.
+
+        Args:
+            start (str or datetime, optional): first day to include
+            end (str or datetime, optional): last day to include
+
+        Returns:
+            Pandas DataFrame indexed by date, with columns consumption, cost
+            and price.
+
+        Notes:
+            Aggregates are maintained by the database and only the modified
+            days are computed again, so this doesn't scan the whole history.
+        """
+        return self._db.get_daily_rollups(start, end)
+
+    def get_monthly_summary(self, start=None, end=None):
+        """Return monthly consumption, cost and consumption-weighted average price.
+
+        Args:
+            start (str or datetime, optional): first month to include
+            end (str or datetime, optional): last month to include
+
+        Returns:
+            Pandas DataFrame indexed by the first day of the month, with
+            columns consumption, cost and price.
+        """
+        return self._db.get_monthly_rollups(start, end)
+
+    def get_missing_ranges(self, column="price", start=None, end=None):
+        """Return time ranges with missing prices or amounts.
+
+        Args:
+            column (str, optional): 'price' or 'amount'
+            start (str or datetime, optional): first time to include
+            end (str or datetime, optional): end of the time range to include
+
+        Returns:
+            A Selection object of the missing ranges, which update jobs can
+            use to fetch only the missing data.
+
+        Notes:
+            Missing ranges are kept in an index, which is updated when the
+            database is modified, so this doesn't scan the whole history.
+            Only the time span of the database is covered, e.g. prices after
+            the newest price are not missing.
+        """
+        selection = Selection()
+        for start_, end_ in zip(*self._db.get_gaps(column, start, end)):
+            selection.add_timerange(
+                datetime.datetime.fromtimestamp(start_, datetime.timezone.utc),
+                datetime.datetime.fromtimestamp(end_, datetime.timezone.utc),
+            )
+        return selection
+
+    def _check_sites(self):
+        """Raise ValueError, if the storage engine doesn't support sites."""
+        if not self._db.supports_sites:
+            raise ValueError(
+                f"{type(self._db).__name__} doesn't store consumption of sites, "
+                "use the 'columnar' engine"
+            )
+
+    def get_sites(self):
+        """Return identifiers of the sites (metering points) in the database."""
+        return self._db.get_sites()
+
+    def get_site_consumption(self, start=None, end=None):
+        """Return consumption of every site.
+
+        Args:
+            start (str or datetime, optional): first time to include
+            end (str or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, one column per site.
+
+        Raises:
+            ValueError, if the storage engine doesn't support sites.
+        """
+        self._check_sites()
+        return self._db.get_site_amounts(start, end)
+
+    def get_site_costs(self, start=None, end=None):
+        """Return daily consumption cost of every site.
+
+        Args:
+            start (str or datetime, optional): first day to include
+            end (str or datetime, optional): last day to include
+
+        Returns:
+            Pandas DataFrame indexed by local date, one column per site.
+
+        Raises:
+            ValueError, if the storage engine doesn't support sites.
+        """
+        self._check_sites()
+        return self._db.get_site_costs(start, end)
 
-    def get_future_prices(self):
+    def get_future_prices(self, area=None):
         """Return all records from a database which are newer than current time.
 
         Args:
-            Nothing.
+            area (str, optional): bidding area, by default the default area
 
         Returns:
-            A list of Record objects.
+            A list of Record objects. With an area, price of the record is
+            the price of the area.
         """
         now = datetime.datetime.utcnow()
-        records = self._db.filter_by_time(start=now).get_records()
-        return list(filter(lambda r: r.has_price(), records.values()))
+        database = self._db.filter_by_time(start=now)
+        if area is None:
+            records = database.get_records().values()
+            return list(filter(lambda r: r.has_price(), records))
+        times, _, amounts = database.to_arrays()
+        prices = self._get_area_prices(database, area)
+        priced = np.flatnonzero(~np.isnan(prices))
+        return list(
+            map(
+                Record.from_epoch,
+                times[priced].tolist(),
+                prices[priced].tolist(),
+                amounts[priced].tolist(),
+            )
+        )
+
+    @staticmethod
+    def _get_area_prices(database, area):
+        """Return prices of a bidding area as an array aligned with times."""
+        prices = database.get_area_prices()
+        if area not in prices:
+            raise KeyError(f"No prices for area {area}")
+        return prices[area].to_numpy(dtype=float)
+
+    def get_areas(self):
+        """Return bidding areas having prices in the database."""
+        return self._db.get_areas()
+
+    def get_price_spread(self, start=None, end=None):
+        """Return the lowest and highest price over bidding areas.
+
+        Args:
+            start (str or datetime, optional): first time to include
+            end (str or datetime, optional): last time to include
+
+        Returns:
+            Pandas DataFrame indexed by time, with columns min, max, spread
+            and cheapest, see `AbstractDatabase.get_price_spread`.
+        """
+        return self._db.get_price_spread(start, end)
+
+    def get_resolution(self):
+        """Return resolution of the newest data.
+
+        Returns:
+            Length of one period in seconds, e.g. 3600 for hourly prices and
+            900 for 15-minute prices.
+        """
+        start = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        return self._db.get_resolution(start=start)
+
+    def get_price_horizon(self, area=None, lookback=2, now=None):
+        """Return end of the newest stored price.
+
+        Args:
+            area (str, optional): bidding area, by default the default area
+            lookback (int, optional): number of days to look back from now
+            now (datetime, optional): current time, for testing
 
-    def find_cheapest_hours(self, hours=3, order="time"):
+        Returns:
+            Timezone-aware datetime (UTC), end of the period of the newest
+            price, or None if there are no prices within the lookback.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        database = self._db.filter_by_time(now - datetime.timedelta(days=lookback))
+        times, prices, _ = database.to_arrays()
+        if area is not None:
+            prices = database.get_area_prices().get(area)
+            if prices is None:
+                return None
+            prices = prices.to_numpy(dtype=float)
+        priced = times[~np.isnan(prices)]
+        if len(priced) == 0:
+            return None
+        end = int(priced[-1]) + self._db.get_resolution(start=int(priced[0]))
+        return datetime.datetime.fromtimestamp(end, datetime.timezone.utc)
+
+    def is_price_update_needed(
+        self, areas=None, now=None, publication="14:00", timezone="Europe/Helsinki"
+    ):
+        """Tell whether fetching prices can give any new prices.
+
+        Day-ahead prices of the next day are published once a day. Before the
+        publication time prices are available until the end of today, and
+        after it until the end of tomorrow. If prices are already stored
+        until then, nothing new can be fetched.
+
+        Args:
+            areas (list, optional): bidding areas to check, by default the
+                default area
+            now (datetime, optional): current time, for testing
+            publication (str, optional): local time when the prices of the
+                next day are available from the source
+            timezone (str, optional): time zone of the days and publication
+
+        Returns:
+            boolean
+        """
+        tzinfo = gettz(timezone)
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        local = now.astimezone(tzinfo)
+        published = datetime.datetime.combine(
+            local.date(), datetime.time.fromisoformat(publication), tzinfo
+        )
+        days = 2 if local >= published else 1
+        available = datetime.datetime.combine(
+            local.date() + datetime.timedelta(days=days), datetime.time(), tzinfo
+        )
+        default = self._db.default_area
+        for area in areas or [default]:
+            if area != default and not self._db.supports_areas:
+                # prices of the area can't be stored, so don't wait for them
+                continue
+            horizon = self.get_price_horizon(None if area == default else area, now=now)
+            if horizon is None or horizon < available:
+                return True
+        return False
+
+    def find_cheapest_hours(self, hours=3, order="time", area=None):
         """Find N cheapest hours from future prices.
 
         Args:
+            hours (float): total length of the cheapest periods in hours
             order (str): 'time' or 'price'
+            area (str, optional): bidding area, by default the default area
+
+        Raises:
+            KeyError, if there are no prices for the area.
 
         Returns:
             A Selection object containing N cheapest hours.
+
+        Notes:
+            Periods follow the resolution of the stored prices, e.g. with
+            15-minute prices, 3 hours are the 12 cheapest quarters, which
+            don't need to be consecutive.
         """
         now = datetime.datetime.utcnow()
-        records = self._db.filter_by_time(start=now, end=None).get_records()
+        database = self._db.filter_by_time(start=now, end=None)
+        times, prices, _ = database.to_arrays()
+        if area is not None:
+            prices = self._get_area_prices(database, area)
+        resolution = self._db.get_resolution(start=now)
+        slots = int(round(hours * 3600 / resolution))
+        priced = np.flatnonzero(~np.isnan(prices))
         # sorted by price
-        keys = sorted(records, key=lambda r: records[r].get_price())
-        keys = keys[0:hours]
+        cheapest = priced[np.argsort(prices[priced], kind="stable")[:slots]]
         if order == "time":
             # sorted by time
-            keys = sorted(keys)
+            cheapest = np.sort(cheapest)
         selection = Selection()
-        for start in keys:
-            end = start + datetime.timedelta(hours=1)
-            selection.add_timerange(start, end)
+        period = datetime.timedelta(seconds=resolution)
+        for epoch in times[cheapest].tolist():
+            start = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+            selection.add_timerange(start, start + period)
         return selection
 
     def get_record(self, time):
@@ -1,6 +1,6 @@
 import datetime
-import dateutil.parser
 from entities import Selection
+from entities.timeparsing import parse_time
 
 
 class DateTimePicker:
@@ -17,8 +17,18 @@ class DateTimePicker:
     Like shown above, methods can be chained.
     """
 
-    def __init__(self):
+    def __init__(self, resolution=3600):
+        """Construct a new DateTimePicker object.
+
+        Args:
+            resolution (int, optional): length of a picked period in seconds,
+                e.g. 900 for 15-minute prices
+
+        Returns:
+            A new DateTimePicker object.
+        """
         self._selection = Selection()
+        self._resolution = resolution
 
     def clear(self):
         """Clear selection."""
@@ -34,11 +44,11 @@ class DateTimePicker:
             self
 
         Notes:
-            It is assumed that end time is one hour from start time.
+            End time is one period (by default one hour) from start time.
         """
         if isinstance(start, str):
-            start = dateutil.parser.parse(start).astimezone()
-        end = start + datetime.timedelta(hours=1)
+            start = parse_time(start).astimezone()
+        end = start + datetime.timedelta(seconds=self._resolution)
         self._selection.add_timerange(start, end)
         return self
 
@@ -53,9 +63,9 @@ class DateTimePicker:
             self
         """
         if isinstance(start, str):
-            start = dateutil.parser.parse(start).astimezone()
+            start = parse_time(start).astimezone()
         if isinstance(end, str):
-            end = dateutil.parser.parse(end).astimezone()
+            end = parse_time(end).astimezone()
         self._selection.add_timerange(start, end)
         return self
 
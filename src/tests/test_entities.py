@@ -1,10 +1,12 @@
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from entities import Record
 from entities import Selection
 from entities import ShellyMessage
 from entities import GoogleMessage
+from entities.timeparsing import parse_time, _parse_fixed
+from dateutil import parser
 
 
 class TestRecord(unittest.TestCase):
@@ -21,11 +23,20 @@ class TestRecord(unittest.TestCase):
         self.assertEqual(record1, record2)
         self.assertEqual(record2, record3)
 
+    def test_from_epoch(self):
+        record = Record.from_epoch(1671224400, 10.0, 3.0)
+        self.assertEqual(self.record, record)
+        self.assertEqual(1671224400, record.get_epoch())
+        self.assertEqual(self.record.to_json(), record.to_json())
+        self.assertFalse(hasattr(record, "__dict__"))
+
     def test_record_getters(self):
         record = self.record
         self.assertEqual(
             datetime(2022, 12, 16, 21, 0, 0, tzinfo=pytz.UTC), record.get_time()
         )
+        self.assertEqual(record.get_time(), record.get_time(utc=True))
+        self.assertEqual(record.get_time(), record.get_time(False))
         self.assertEqual(10.0, record.get_price())
         self.assertEqual(3.0, record.get_amount())
 
@@ -42,6 +53,33 @@ class TestRecord(unittest.TestCase):
         self.assertEqual(expected, json)
 
 
+class TestTimeParsing(unittest.TestCase):
+    texts = [
+        "2022-12-26T19:00:00+02:00",
+        "2022-12-20T22:00:00.000Z",
+        "2022-12-16 21:00:00",
+        "2022-12-16 21:00",
+        "2022-12-16T21:00:00.123456-03:30",
+        "2022-12-16",
+    ]
+
+    def test_parse_time(self):
+        for text in self.texts + ["16.12.2022 21:00"]:
+            with self.subTest(text=text):
+                time = parse_time(text)
+                self.assertEqual(parser.parse(text, dayfirst=True), time)
+                self.assertEqual(parser.parse(text).utcoffset(), time.utcoffset())
+        with self.assertRaises(ValueError):
+            parse_time("not a time")
+
+    def test_fixed_layout(self):
+        for text in self.texts:
+            with self.subTest(text=text):
+                self.assertEqual(parser.parse(text), _parse_fixed(text))
+        self.assertIsNone(_parse_fixed("2022-13-16"))
+        self.assertIsNone(_parse_fixed("16.12.2022"))
+
+
 class TestSelection(unittest.TestCase):
     def test_constructor(self):
         s = Selection()
@@ -59,6 +97,18 @@ class TestSelection(unittest.TestCase):
         end = datetime(2022, 12, 24, 14, 0, 0).astimezone()
         self.assertEqual(end, timeranges[start].end)
 
+    def test_pack_quarters(self):
+        selection = Selection()
+        for hour in (23, 22, 5):
+            for minute in (45, 30, 15, 0):
+                start = datetime(2022, 12, 24, hour, minute)
+                end = start + timedelta(minutes=15)
+                selection.add_timerange(start, end)
+        timeranges = list(selection)
+        self.assertEqual(2, len(timeranges))
+        self.assertEqual(datetime(2022, 12, 24, 6, 0), timeranges[0].end)
+        self.assertEqual(datetime(2022, 12, 24, 22, 0), timeranges[1].start)
+
     def test_is_selected(self):
         selection = Selection()
         selection.add_timerange("2022-12-24 12:00", "2022-12-24 13:00")
@@ -97,6 +147,22 @@ class TestShellyMessage(unittest.TestCase):
         ]
         self.assertEqual(expected, msg.get_payloads())
 
+    def test_message_quarters(self):
+        selection = Selection()
+        for start, end in (("18:00", "18:15"), ("18:15", "18:30"), ("20:45", "21:00")):
+            selection.add_timerange(f"2022-12-24 {start}", f"2022-12-24 {end}")
+        msg = ShellyMessage(selection, [0])
+        timespecs = [payload["timespec"] for payload in msg.get_payloads()]
+        self.assertEqual(
+            [
+                "0 0 18 24 12 SAT",
+                "0 30 18 24 12 SAT",
+                "0 45 20 24 12 SAT",
+                "0 0 21 24 12 SAT",
+            ],
+            timespecs,
+        )
+
 
 class TestGoogleMessage(unittest.TestCase):
     def test_message(self):
@@ -1,10 +1,22 @@
 import unittest
 import math
 import io
+import os
+import tempfile
+import time
 from dateutil import parser
 from entities import Record
-from repositories import Database
+from repositories import (
+    Database,
+    ColumnarDatabase,
+    SqliteDatabase,
+    PartitionedDatabase,
+    Journal,
+    Rollups,
+    GapIndex,
+)
 
+import numpy as np
 import pandas as pd
 
 
@@ -17,6 +29,13 @@ class TestDatabase(unittest.TestCase):
         first_record = records[0]
         self.assertEqual(record, first_record)
 
+    def test_records_are_kept_sorted(self):
+        db = Database()
+        for hour in (12, 13, 10, 14, 11):
+            db.add_record(Record(f"2022-12-19 {hour}:00:00", price=hour))
+        self.assertEqual([10.0, 11.0, 12.0, 13.0, 14.0], [r.get_price() for r in db])
+        self.assertEqual(list(db.get_records()), db.get_index())
+
     def test_to_dataframe(self):
         db = Database()
         db.add_record(Record("2022-11-28T00:00:00", 10.0))
@@ -30,6 +49,25 @@ class TestDatabase(unittest.TestCase):
         print("type of row2.name is ", type(row2.name))
         self.assertEqual(pd.Timestamp("2022-11-28T01:00:00Z"), row2.name)
 
+    def test_to_dataframe_is_cached(self):
+        db = Database()
+        db.add_record(Record("2022-11-28T00:00:00", 10.0))
+        version = db.get_version()
+        df = db.to_dataframe()
+        self.assertIs(df, db.to_dataframe())
+        db.add_record(Record("2022-11-28T01:00:00", 20.0))
+        self.assertLess(version, db.get_version())
+        self.assertEqual([10.0, 20.0], db.to_dataframe().price.tolist())
+        db.update_record(Record("2022-11-28T00:00:00", price=5.0))
+        self.assertEqual([5.0, 20.0], db.to_dataframe().price.tolist())
+        db.add_record(Record("2022-11-27T23:00:00", 1.0))
+        self.assertEqual([1.0, 5.0, 20.0], db.to_dataframe().price.tolist())
+        db.drop_cache()
+        self.assertIsNot(df, db.to_dataframe())
+        df = db.to_dataframe(start="2022-11-28T00:00:00")
+        self.assertEqual([5.0, 20.0], df.price.tolist())
+        self.assertIs(df, db.to_dataframe(start="2022-11-28T00:00:00"))
+
     def test_from_dataframe(self):
         t1 = parser.parse("2022-12-16T15:00:00")
         t2 = parser.parse("2022-12-16T16:00:00")
@@ -39,6 +77,136 @@ class TestDatabase(unittest.TestCase):
         recs = list(db.get_records().values())
         self.assertEqual(1.0, recs[0].get_price())
 
+    def test_from_dataframe_converts_time_zone(self):
+        index = pd.date_range(
+            "2022-12-16 17:00", periods=2, freq="h", tz="Europe/Helsinki"
+        )
+        df = pd.DataFrame({"amount": [3.0, 4.0]}, index=index)
+        db = Database()
+        db.from_dataframe(df)
+        record = db.get_record("2022-12-16T15:00:00+00:00")
+        self.assertEqual(3.0, record.get_amount())
+        self.assertFalse(record.has_price())
+        with self.assertRaises(KeyError):
+            db.from_dataframe(pd.DataFrame({"price": [1, 2]}, index=[index[0]] * 2))
+        with self.assertRaises(ValueError):
+            db.from_dataframe(df, mode="append")
+
+    def test_from_dataframe_large_time_zone_index(self):
+        index = pd.date_range(
+            "2020-01-01", periods=200000, freq="h", tz="Europe/Helsinki"
+        )
+        df = pd.DataFrame({"price": np.arange(200000.0)}, index=index)
+        db = ColumnarDatabase()
+        started = time.perf_counter()
+        db.from_dataframe(df)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        np.testing.assert_array_equal(index.asi8 // 10**9, db.to_arrays()[0])
+        naive = pd.DataFrame({"price": [1.0]}, index=[pd.Timestamp("2020-01-01")])
+        db.from_dataframe(naive)
+        self.assertEqual([1577836800], db.to_arrays()[0].tolist())
+
+    def test_from_dataframe_merge(self):
+        db = Database()
+        db.track_changes()
+        db.add_record(Record("2022-12-16T15:00:00", price=1.0, amount=2.0))
+        db.add_record(Record("2022-12-16T17:00:00", price=5.0))
+        index = pd.to_datetime(
+            ["2022-12-16T17:00:00", "2022-12-16T15:00:00", "2022-12-16T16:00:00"]
+        )
+        df = pd.DataFrame(
+            {"price": [5.0, np.nan, 3.0], "amount": [6.0, 7.0, np.nan]}, index=index
+        )
+        db.from_dataframe(df, mode="merge")
+        times, prices, amounts = db.to_arrays()
+        self.assertEqual(3, len(times))
+        np.testing.assert_array_equal([1.0, 3.0, 5.0], prices)
+        np.testing.assert_array_equal([7.0, np.nan, 6.0], amounts)
+        self.assertEqual(3, len(db.pop_changes()))
+
+    def test_track_changes(self):
+        db = Database()
+        db.upsert_many(["2022-12-16T15:00:00"], prices=[1.0])
+        self.assertEqual([], db.pop_changes())
+        db.track_changes()
+        db.upsert_many(["2022-12-16T15:00:00"], prices=[2.0])
+        self.assertEqual(1, len(db.pop_changes()))
+        db.upsert_many(["2022-12-16T15:00:00"], prices=[3.0])
+        db.track_changes(False)
+        self.assertEqual([], db.pop_changes())
+
+    def test_upsert_zero_and_negative(self):
+        engines = (Database, ColumnarDatabase, SqliteDatabase, PartitionedDatabase)
+        for engine in engines:
+            with self.subTest(engine=engine.__name__):
+                db = engine()
+                times = ["2022-12-16T15:00:00Z", "2022-12-16T16:00:00Z"]
+                db.upsert_many(times, prices=[1.0, 2.0], amounts=[3.0, 4.0])
+                self.assertEqual(
+                    (2, 1),
+                    db.upsert_many(times, prices=[0.0, -0.5], amounts=[0.0, 4.0]),
+                )
+                _, prices, amounts = db.to_arrays()
+                np.testing.assert_array_equal([0.0, -0.5], prices)
+                np.testing.assert_array_equal([0.0, 4.0], amounts)
+                self.assertEqual((0, 0), db.upsert_many(times, prices=[0.0, -0.5]))
+
+    def test_upsert_many(self):
+        engines = (Database, ColumnarDatabase, SqliteDatabase, PartitionedDatabase)
+        for engine in engines:
+            with self.subTest(engine=engine.__name__):
+                db = engine()
+                db.track_changes()
+                db.add_record(Record("2022-12-16T15:00:00", price=1.0, amount=2.0))
+                db.add_record(Record("2023-01-16T17:00:00", price=5.0))
+                db.pop_changes()
+                updated = db.upsert_many(
+                    [
+                        "2023-01-16T19:00:00+02:00",
+                        "2022-12-16T15:00:00Z",
+                        "2022-12-16T16:00:00Z",
+                        "2022-12-16T16:00:00Z",
+                    ],
+                    prices=[5.0, np.nan, 3.0, np.nan],
+                    amounts=[6.0, 7.0, np.nan, 8.0],
+                )
+                self.assertEqual((1, 3), updated)
+                times, prices, amounts = db.to_arrays()
+                self.assertEqual(3, len(times))
+                np.testing.assert_array_equal([1.0, 3.0, 5.0], prices)
+                np.testing.assert_array_equal([7.0, 8.0, 6.0], amounts)
+                self.assertEqual(3, len(db.pop_changes()))
+                self.assertEqual((0, 0), db.upsert_many([times[0]], [1.0], [7.0]))
+                self.assertEqual([], db.pop_changes())
+
+    def test_merge(self):
+        times = [
+            "2022-12-16T15:00:00Z",
+            "2022-12-16T16:00:00Z",
+            "2022-12-16T17:00:00Z",
+        ]
+        other = ColumnarDatabase()
+        other.upsert_many(times[1:], prices=[4.0, 5.0], amounts=[np.nan, 6.0])
+        expected = {
+            "prefer-left": ([1.0, 2.0, 5.0], [1.0, 3.0, 6.0]),
+            "prefer-right": ([1.0, 4.0, 5.0], [1.0, np.nan, 6.0]),
+            "prefer-non-nan": ([1.0, 4.0, 5.0], [1.0, 3.0, 6.0]),
+        }
+        engines = (Database, ColumnarDatabase, SqliteDatabase, PartitionedDatabase)
+        for engine in engines:
+            for policy, (prices, amounts) in expected.items():
+                with self.subTest(engine=engine.__name__, policy=policy):
+                    db = engine()
+                    db.upsert_many(times[:2], prices=[1.0, 2.0], amounts=[1.0, 3.0])
+                    stats = db.merge(other, policy=policy)
+                    self.assertEqual(1, stats["added"])
+                    self.assertEqual(1, stats["overlapping"])
+                    self.assertEqual(1, stats["conflicts"])
+                    _, merged_prices, merged_amounts = db.to_arrays()
+                    np.testing.assert_array_equal(prices, merged_prices)
+                    np.testing.assert_array_equal(amounts, merged_amounts)
+        self.assertRaises(ValueError, Database().merge, other, policy="newest")
+
     def test_add_or_update_record(self):
         db = Database()
         record = Record("2022-12-16 21:00:00", price=20.0, amount=3.0)
@@ -68,6 +236,20 @@ class TestDatabase(unittest.TestCase):
         self.assertTrue(math.isnan(records[1].get_price()))
         self.assertEqual(4.0, records[1].get_amount())
 
+    def test_read_db_unsorted_and_duplicates(self):
+        data = (
+            "time,price,amount\n"
+            "2022-12-16T23:00:00+02:00,nan,4.0000\n"
+            "2022-12-16T20:00:00,20.0000,3.0000\n"
+        )
+        db = Database()
+        db.read_csv(io.StringIO(data))
+        times = [record.get_time().hour for record in db.get_records().values()]
+        self.assertEqual([20, 21], times)
+        data += "2022-12-16T21:00:00+00:00,1.0000,nan\n"
+        with self.assertRaises(KeyError):
+            db.read_csv(io.StringIO(data))
+
     def test_write_db(self):
         db = Database()
         record = Record("2022-12-16 22:00:00", amount=4.0)
@@ -93,3 +275,373 @@ class TestDatabase(unittest.TestCase):
         db.add_record(Record("2022-12-19 12:00:00"))
         records = db.filter_by_time(start="2022-12-19 10:30:00").get_records()
         self.assertEqual(2, len(records))
+        view = db.filter_by_time("2022-12-19 10:00:00", "2022-12-19 11:00:00")
+        self.assertEqual(2, len(view))
+        self.assertEqual(1, len(view.filter_by_time("2022-12-19 10:30:00")))
+        self.assertTrue(view.has_record(Record("2022-12-19 11:00:00")))
+        with self.assertRaises(KeyError):
+            view.get_record("2022-12-19 12:00:00")
+        with self.assertRaises(TypeError):
+            view.add_record(Record("2022-12-19 10:30:00"))
+
+
+class TestColumnarDatabase(unittest.TestCase):
+    def test_add_and_get_record(self):
+        db = ColumnarDatabase()
+        db.add_record(Record("2022-12-16 22:00:00", amount=4.0))
+        db.add_record(Record("2022-12-16 21:00:00", price=20.0, amount=3.0))
+        records = list(db.get_records().values())
+        self.assertEqual(2, len(db))
+        self.assertEqual(Record("2022-12-16 21:00:00", 20.0, 3.0), records[0])
+        self.assertEqual(4.0, db.get_record("2022-12-16 22:00:00").get_amount())
+        with self.assertRaises(KeyError):
+            db.add_record(Record("2022-12-16 21:00:00"))
+        with self.assertRaises(KeyError):
+            db.get_record("2022-12-16 23:00:00")
+
+    def test_add_or_update_record(self):
+        db = ColumnarDatabase()
+        db.add_record(Record("2022-12-16 21:00:00", price=20.0, amount=3.0))
+        updated = db.add_or_update_record(Record("2022-12-16 21:00:00", amount=4.0))
+        self.assertEqual((False, True), updated)
+        record = db.get_record("2022-12-16 21:00:00")
+        self.assertEqual(20.0, record.get_price())
+        self.assertEqual(4.0, record.get_amount())
+
+    def test_filter_by_time(self):
+        db = ColumnarDatabase()
+        for hour in range(10, 15):
+            db.add_record(Record(f"2022-12-19 {hour}:00:00", price=hour))
+        self.assertEqual(4, len(db.filter_by_time(start="2022-12-19 10:30:00")))
+        filtered = db.filter_by_time("2022-12-19 11:00:00", "2022-12-19 13:00:00")
+        self.assertEqual([11.0, 12.0, 13.0], filtered.to_dataframe().price.tolist())
+        self.assertTrue(np.shares_memory(filtered.to_arrays()[1], db.to_arrays()[1]))
+        filtered.add_or_update_record(Record("2022-12-19 11:00:00", price=1.0))
+        self.assertEqual(11.0, db.get_record("2022-12-19 11:00:00").get_price())
+
+    def test_to_dataframe(self):
+        db = ColumnarDatabase()
+        db.add_record(Record("2022-11-28T00:00:00", 10.0))
+        db.add_record(Record("2022-11-28T01:00:00", 20.0))
+        df = db.to_dataframe()
+        self.assertEqual(2, len(df))
+        self.assertEqual(10.0, df.iloc[0]["price"])
+        self.assertEqual(pd.Timestamp("2022-11-28T01:00:00Z"), df.iloc[1].name)
+
+    def test_to_dataframe_is_cached(self):
+        db = ColumnarDatabase()
+        db.dataframe_cache_limit = 2
+        db.add_record(Record("2022-11-28T00:00:00", 10.0))
+        df = db.to_dataframe()
+        self.assertIs(df, db.to_dataframe())
+        db.update_record(Record("2022-11-28T00:00:00", price=5.0))
+        self.assertEqual([5.0], db.to_dataframe().price.tolist())
+        db.add_record(Record("2022-11-28T01:00:00", 20.0))
+        self.assertEqual([5.0, 20.0], db.to_dataframe().price.tolist())
+        db.add_record(Record("2022-11-28T02:00:00", 30.0))
+        df = db.to_dataframe()
+        self.assertEqual(3, len(df))
+        self.assertIsNot(df, db.to_dataframe())
+
+    def test_read_and_write_csv(self):
+        data = (
+            "time,price,amount\n"
+            "2022-12-16T21:00:00+00:00,20.0000,3.0000\n"
+            "2022-12-16T22:00:00+00:00,nan,4.0000\n"
+        )
+        db = ColumnarDatabase()
+        db.read_csv(io.StringIO(data))
+        out = io.StringIO()
+        db.write_csv(out)
+        self.assertEqual(data, out.getvalue())
+
+    def test_sites(self):
+        db = ColumnarDatabase()
+        db.upsert_many(
+            ["2022-12-16 21:00", "2022-12-16 22:00", "2022-12-16 23:00"],
+            prices=[1.0, 2.0, 3.0],
+        )
+        times = ["2022-12-16 21:00", "2022-12-16 22:00"]
+        self.assertEqual(2, db.upsert_site_amounts("a", times, [1.0, 2.0]))
+        self.assertEqual(0, db.upsert_site_amounts("a", times, [1.0, np.nan]))
+        self.assertEqual(1, db.upsert_site_amounts("b", times[1:], [3.0]))
+        db.add_record(Record("2022-12-17 10:00", price=1.0))
+        db.upsert_many(["2022-12-16 20:00"], prices=[0.5])
+        self.assertEqual(["a", "b"], db.get_sites())
+        self.assertEqual(5.0, db.get_record("2022-12-16 22:00").get_amount())
+        amounts = db.get_site_amounts(end="2022-12-16 22:00")
+        np.testing.assert_array_equal([np.nan, 1.0, 2.0], amounts["a"].values)
+        np.testing.assert_array_equal([np.nan, np.nan, 3.0], amounts["b"].values)
+        costs = db.get_site_costs(timezone="UTC")
+        self.assertEqual([5.0, 0.0], costs["a"].tolist())
+        self.assertEqual([6.0, 0.0], costs["b"].tolist())
+        costs = db.get_site_costs(start="2022-12-17", timezone="UTC")
+        self.assertEqual(["2022-12-17"], costs.index.strftime("%Y-%m-%d").tolist())
+        # 22:00 UTC is already the next day in Helsinki
+        costs = db.get_site_costs(end="2022-12-16", timezone="Europe/Helsinki")
+        self.assertEqual([1.0], costs["a"].tolist())
+        out = io.StringIO()
+        db.write_csv(out)
+        self.assertTrue(out.getvalue().startswith("time,price,amount,amount:a"))
+        db2 = ColumnarDatabase()
+        db2.read_csv(io.StringIO(out.getvalue()))
+        self.assertTrue(db2.get_site_amounts().equals(db.get_site_amounts()))
+
+    def test_areas(self):
+        db = ColumnarDatabase()
+        times = ["2022-12-16 21:00", "2022-12-16 22:00", "2022-12-16 23:00"]
+        db.upsert_many(times[:2], prices=[1.0, 2.0])
+        self.assertEqual(3, db.upsert_area_prices("SE3", times, [3.0, 1.0, 4.0]))
+        self.assertEqual(1, db.upsert_area_prices("EE", times[1:2], [0.5]))
+        self.assertEqual(["FI", "SE3", "EE"], db.get_areas())
+        spread = db.get_price_spread()
+        np.testing.assert_array_equal([2.0, 1.5, 0.0], spread["spread"].values)
+        self.assertEqual(["FI", "EE", "SE3"], spread["cheapest"].tolist())
+        out = io.StringIO()
+        db.write_csv(out)
+        db2 = ColumnarDatabase()
+        db2.read_csv(io.StringIO(out.getvalue()))
+        self.assertTrue(db2.get_area_prices().equals(db.get_area_prices()))
+        self.assertRaises(
+            NotImplementedError, Database().upsert_area_prices, "EE", [], []
+        )
+
+
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.db = Database()
+        self.db.add_record(Record("2022-12-16 21:00:00", price=20.0, amount=3.0))
+        self.db.add_record(Record("2022-12-16 22:00:00", amount=4.0))
+
+    def write(self, db):
+        tf = tempfile.TemporaryFile()
+        db.write_binary(tf)
+        tf.seek(0)
+        return tf
+
+    def test_read_binary(self):
+        with self.write(self.db) as tf:
+            db = ColumnarDatabase()
+            db.read_binary(tf)
+        self.assertEqual(2, len(db))
+        self.assertEqual(20.0, db.get_record("2022-12-16 21:00:00").get_price())
+        self.assertTrue(math.isnan(db.get_record("2022-12-16 22:00:00").get_price()))
+
+    def test_modify_mapped_database(self):
+        with self.write(self.db) as tf:
+            db = ColumnarDatabase()
+            db.read_binary(tf)
+        db.add_or_update_record(Record("2022-12-16 22:00:00", price=5.0))
+        db.add_record(Record("2022-12-16 23:00:00", price=6.0))
+        self.assertEqual([20.0, 5.0, 6.0], db.to_dataframe().price.tolist())
+
+    def test_records_database(self):
+        with self.write(self.db) as tf:
+            db = Database()
+            db.read_binary(tf)
+        self.assertEqual(list(self.db.get_records()), list(db.get_records()))
+
+    def test_invalid_file(self):
+        with tempfile.TemporaryFile() as tf:
+            tf.write(b"time,price,amount\n" * 4)
+            tf.seek(0)
+            with self.assertRaises(ValueError):
+                ColumnarDatabase().read_binary(tf)
+
+
+class TestJournal(unittest.TestCase):
+    def test_append_and_replay(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = Journal(os.path.join(tmpdir, "db.csv.journal"))
+            db = Database()
+            db.track_changes()
+            db.add_or_update_record(Record("2022-12-16 21:00:00", price=20.0))
+            db.add_or_update_record(Record("2022-12-16 21:00:00", amount=3.0))
+            db.add_or_update_record(Record("2022-12-16 21:00:00", amount=3.0))
+            self.assertEqual(2, journal.append(db.pop_changes()))
+            self.assertEqual([], db.pop_changes())
+            db = Database()
+            self.assertEqual(2, journal.replay(db))
+            self.assertEqual(
+                Record("2022-12-16 21:00:00", 20.0, 3.0),
+                db.get_record("2022-12-16 21:00:00"),
+            )
+
+    def test_incomplete_entry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = Journal(os.path.join(tmpdir, "db.csv.journal"))
+            journal.append([Record("2022-12-16 21:00:00", price=20.0)])
+            with open(journal.get_filename(), "a", encoding="utf-8") as file:
+                file.write("2022-12-16T22:00:00+00:00,1.0")
+            self.assertEqual(1, len(journal.read()))
+
+
+class TestSqliteDatabase(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDatabase()
+        for hour in range(10, 15):
+            self.db.add_record(Record(f"2022-12-19 {hour}:00:00", price=hour))
+
+    def test_get_record(self):
+        record = self.db.get_record("2022-12-19 12:00:00")
+        self.assertEqual(12.0, record.get_price())
+        self.assertTrue(math.isnan(record.get_amount()))
+        with self.assertRaises(KeyError):
+            self.db.get_record("2022-12-19 15:00:00")
+        with self.assertRaises(KeyError):
+            self.db.add_record(Record("2022-12-19 12:00:00"))
+
+    def test_add_or_update_record(self):
+        record = Record("2022-12-19 12:00:00", amount=3.0)
+        self.assertEqual((False, True), self.db.add_or_update_record(record))
+        self.assertEqual((False, False), self.db.add_or_update_record(record))
+        record = self.db.get_record("2022-12-19 12:00:00")
+        self.assertEqual(Record("2022-12-19 12:00:00", 12.0, 3.0), record)
+
+    def test_filter_by_time(self):
+        filtered = self.db.filter_by_time("2022-12-19 11:00:00", "2022-12-19 13:00:00")
+        self.assertEqual([11.0, 12.0, 13.0], filtered.to_dataframe().price.tolist())
+        self.assertEqual(4, len(self.db.filter_by_time("2022-12-19 10:30:00")))
+
+    def test_clear(self):
+        self.db.clear()
+        self.assertEqual(0, len(self.db))
+        self.assertEqual(0, len(self.db.to_dataframe()))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.sqlite")
+            db = SqliteDatabase(dbfile)
+            db.load_arrays(*self.db.to_arrays())
+            db.close()
+            db = SqliteDatabase(dbfile)
+            self.assertEqual(5, len(db))
+            db.close()
+
+
+class TestPartitionedDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, "db.parts")
+        db = ColumnarDatabase()
+        for month in range(1, 13):
+            db.add_record(Record(f"2021-{month:02d}-15 12:00:00", price=month))
+        self.db = PartitionedDatabase(self.directory, max_partitions=3)
+        self.db.load_arrays(*db.to_arrays())
+        self.db.commit()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_partition_files(self):
+        self.assertEqual(12, len(os.listdir(self.directory)))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "2021-06.bin")))
+
+    def test_lazy_loading(self):
+        db = PartitionedDatabase(self.directory, max_partitions=3)
+        self.assertEqual([], db.get_resident_months())
+        df = db.to_dataframe("2021-03-01", "2021-04-30")
+        self.assertEqual([3.0, 4.0], df.price.tolist())
+        self.assertEqual(["2021-03", "2021-04"], db.get_resident_months())
+        self.assertEqual(12, len(db))
+        self.assertEqual(3, len(db.get_resident_months()))
+
+    def test_update_and_commit(self):
+        db = PartitionedDatabase(self.directory, max_partitions=1)
+        db.add_or_update_record(Record("2021-01-15 12:00:00", amount=1.0))
+        db.add_or_update_record(Record("2022-01-15 12:00:00", price=13.0))
+        db.commit()
+        db = PartitionedDatabase(self.directory)
+        self.assertEqual(1.0, db.get_record("2021-01-15 12:00:00").get_amount())
+        self.assertEqual(13.0, db.get_record("2022-01-15 12:00:00").get_price())
+        db.clear()
+        db.commit()
+        self.assertEqual([], os.listdir(self.directory))
+
+
+class TestRollups(unittest.TestCase):
+    def test_rollups(self):
+        for engine in (Database, ColumnarDatabase, PartitionedDatabase):
+            with self.subTest(engine=engine.__name__):
+                db = engine()
+                # 2022-12-31 22:00 UTC is already 2023-01-01 in Helsinki
+                db.upsert_many(
+                    ["2022-12-31T10:00:00Z", "2022-12-31T11:00:00Z"],
+                    prices=[1.0, 3.0],
+                    amounts=[1.0, 3.0],
+                )
+                db.upsert_many(["2022-12-31T22:00:00Z"], amounts=[2.0])
+                daily = db.get_daily_rollups()
+                self.assertEqual([4.0, 2.0], daily.consumption.tolist())
+                self.assertEqual(10.0, daily.cost.iloc[0])
+                self.assertEqual(2.5, daily.price.iloc[0])
+                self.assertTrue(math.isnan(daily.price.iloc[1]))
+                db.upsert_many(["2022-12-31T22:00:00Z"], prices=[2.0])
+                db.add_record(Record("2023-01-02T10:00:00Z", price=1.0, amount=1.0))
+                db.update_record(Record("2022-12-31T10:00:00Z", amount=2.0))
+                daily = db.get_daily_rollups(start="2023-01-01")
+                self.assertEqual([2.0, 1.0], daily.consumption.tolist())
+                self.assertEqual([4.0, 1.0], daily.cost.tolist())
+                monthly = db.get_monthly_rollups()
+                self.assertEqual([5.0, 3.0], monthly.consumption.tolist())
+                self.assertEqual([11.0, 5.0], monthly.cost.tolist())
+                self.assertEqual(
+                    [pd.Timestamp("2022-12-01"), pd.Timestamp("2023-01-01")],
+                    list(monthly.index),
+                )
+
+    def test_time_zone(self):
+        db = ColumnarDatabase()
+        db.upsert_many(["2022-12-31T22:00:00Z"], amounts=[2.0])
+        daily = Rollups(timezone="UTC").get_daily(db)
+        self.assertEqual([pd.Timestamp("2022-12-31")], list(daily.index))
+
+
+class TestGapIndex(unittest.TestCase):
+    def test_gaps(self):
+        db = ColumnarDatabase()
+        hour = 3600
+        db.upsert_many(
+            [hour * i for i in range(6)],
+            prices=[1.0, np.nan, np.nan, 1.0, 1.0, np.nan],
+            amounts=[1.0] * 6,
+        )
+        starts, ends = db.get_gaps("price")
+        self.assertEqual([hour, 5 * hour], starts.tolist())
+        self.assertEqual([3 * hour, 6 * hour], ends.tolist())
+        self.assertEqual(0, len(db.get_gaps("amount")[0]))
+        starts, ends = db.get_gaps("price", start=2 * hour, end=5 * hour)
+        self.assertEqual([2 * hour], starts.tolist())
+        self.assertEqual([3 * hour], ends.tolist())
+        self.assertRaises(KeyError, db.get_gaps, "cost")
+
+    def test_incremental_update(self):
+        rng = np.random.default_rng(0)
+        for engine in (Database, ColumnarDatabase):
+            with self.subTest(engine=engine.__name__):
+                db = engine()
+                db.upsert_many(np.arange(48) * 3600, prices=np.ones(48))
+                for i in range(20):
+                    times = np.sort(rng.choice(np.arange(-24, 96), 5, replace=False))
+                    values = np.where(rng.random(5) < 0.3, np.nan, 1.0)
+                    other = ColumnarDatabase.from_arrays(times * 3600, values, values)
+                    # prefer-right also creates new gaps
+                    db.merge(other, ("prefer-right", "prefer-non-nan")[i % 2])
+                    for column in ("price", "amount"):
+                        expected = GapIndex().get_gaps(db, column)
+                        result = db.get_gaps(column)
+                        np.testing.assert_array_equal(expected[0], result[0])
+                        np.testing.assert_array_equal(expected[1], result[1])
+
+    def test_resolution_change(self):
+        hour = 3600
+        db = ColumnarDatabase()
+        db.upsert_many([0, hour, 2 * hour], prices=[1.0] * 3)
+        self.assertEqual(0, len(db.get_gaps("price")[0]))
+        # aligned to the old resolution, but most rows are now 2 hours apart
+        db.upsert_many([4 * hour, 6 * hour, 8 * hour], prices=[1.0] * 3)
+        self.assertEqual(2 * hour, db.get_resolution())
+        expected = GapIndex().get_gaps(db, "price")
+        result = db.get_gaps("price")
+        np.testing.assert_array_equal(expected[0], result[0])
+        np.testing.assert_array_equal(expected[1], result[1])
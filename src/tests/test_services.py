@@ -1,7 +1,11 @@
+import datetime
+import os
+import time
+import tempfile
 import unittest
 from services import DateTimePicker
 from services import DataService
-from repositories import Database
+from repositories import Database, ColumnarDatabase
 from entities import Record
 
 
@@ -16,6 +20,24 @@ class TestDateTimePicker(unittest.TestCase):
         self.assertTrue("2022-12-18 18:30" in selection)
         self.assertTrue("2022-12-18 19:00" not in selection)
 
+    def test_pick_quarter(self):
+        p = DateTimePicker(resolution=900)
+        p.pick("2022-12-18 13:00").pick("2022-12-18 13:15")
+        selection = p.to_selection()
+        self.assertTrue("2022-12-18 13:20" in selection)
+        self.assertTrue("2022-12-18 13:30" not in selection)
+
+
+class _SlowSource:
+    def __init__(self, database, hour, delay=0.3):
+        self._db = database
+        self._hour = hour
+        self._delay = delay
+
+    def update(self):
+        time.sleep(self._delay)
+        return self._db.upsert_many([f"2022-12-25 {self._hour}:00"], prices=[1.0])
+
 
 class TestDataService(unittest.TestCase):
     def test_find_cheapest_hours(self):
@@ -31,3 +53,214 @@ class TestDataService(unittest.TestCase):
         self.assertEqual(
             "2022-12-25T20:00:00+00:00 - 2022-12-25T22:00:00+00:00", str(selection)
         )
+
+    def test_find_cheapest_quarters(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start = now.replace(minute=0, second=0, microsecond=0)
+        start += datetime.timedelta(hours=1)
+        times = [start + datetime.timedelta(minutes=15 * i) for i in range(96)]
+        prices = [10.0] * 96
+        for i in (5, 6, 40, 41, 42):
+            prices[i] = 1.0
+        prices[7] = float("nan")
+        db = ColumnarDatabase()
+        db.upsert_many(times, prices=prices)
+        ds = DataService(database=db)
+        self.assertEqual(900, ds.get_resolution())
+        selection = ds.find_cheapest_hours(hours=1)
+        timeranges = list(selection)
+        self.assertEqual(2, len(timeranges))
+        self.assertEqual((times[5], times[7]), tuple(timeranges[0]))
+        self.assertEqual(times[40], timeranges[1].start)
+        self.assertEqual(datetime.timedelta(minutes=30), timeranges[1].end - times[40])
+
+    def test_find_cheapest_hours_in_area(self):
+        start = datetime.datetime.now(datetime.timezone.utc)
+        start = start.replace(minute=0, second=0, microsecond=0)
+        times = [start + datetime.timedelta(hours=i) for i in range(1, 4)]
+        db = ColumnarDatabase()
+        db.upsert_many(times, prices=[1.0, 2.0, 3.0])
+        db.upsert_area_prices("SE3", times, [3.0, 2.0, 1.0])
+        ds = DataService(database=db)
+        selection = ds.find_cheapest_hours(hours=1, area="SE3")
+        self.assertEqual(times[2], list(selection)[0].start)
+        self.assertEqual(1.0, ds.get_future_prices(area="SE3")[-1].get_price())
+        self.assertRaises(KeyError, ds.find_cheapest_hours, area="EE")
+
+    def test_is_price_update_needed(self):
+        tz = datetime.timezone(datetime.timedelta(hours=2))
+        today = datetime.datetime(2022, 12, 20, tzinfo=tz)
+        morning = today.replace(hour=9)
+        evening = today.replace(hour=16)
+        db = ColumnarDatabase()
+        ds = DataService(database=db)
+        self.assertTrue(ds.is_price_update_needed(now=morning, timezone="EET"))
+        times = [today + datetime.timedelta(hours=i) for i in range(24)]
+        db.upsert_many(times, prices=[1.0] * 24)
+        self.assertFalse(ds.is_price_update_needed(now=morning, timezone="EET"))
+        self.assertTrue(ds.is_price_update_needed(now=evening, timezone="EET"))
+        times = [today + datetime.timedelta(hours=i) for i in range(24, 48)]
+        db.upsert_many(times, prices=[1.0] * 24)
+        self.assertFalse(ds.is_price_update_needed(now=evening, timezone="EET"))
+        self.assertTrue(
+            ds.is_price_update_needed(areas=["FI", "SE3"], now=evening, timezone="EET")
+        )
+
+    def test_update_db_concurrently(self):
+        db = Database()
+        ds = DataService(database=db, journal_limit=10)
+        ds.add_source("slow", _SlowSource)
+        sources = [
+            ("slow", {"hour": 20}, None),
+            ("slow", {"hour": 21}, None),
+            ("slow", {"hour": 22, "delay": 1.0}, 0.5),
+            ("unknown", {}, None),
+        ]
+        started = time.monotonic()
+        results = ds.update_db_concurrently(sources, timeout=2.0)
+        self.assertLess(time.monotonic() - started, 1.5)
+        statuses = [result["status"] for result in results]
+        self.assertEqual(["ok", "ok", "timeout", "error"], statuses)
+        self.assertEqual((1, 0), results[0]["updated"])
+        self.assertEqual(2, len(db))
+        self.assertEqual(2, len(db.pop_changes()))
+
+    def test_merge_staging_sites(self):
+        db = ColumnarDatabase()
+        db.upsert_site_amounts("A", ["2022-12-20 20:00"], [1.0])
+        db.upsert_site_amounts("B", ["2022-12-20 20:00"], [2.0])
+        ds = DataService(database=db)
+        staging = ds._create_staging()
+        staging.upsert_site_amounts("A", ["2022-12-20 20:00"], [1.0])
+        ds._merge_staging(db, staging)
+        self.assertEqual(3.0, db.get_record("2022-12-20 20:00").get_amount())
+        staging = ds._create_staging()
+        staging.upsert_site_amounts("A", ["2022-12-20 20:00"], [5.0])
+        ds._merge_staging(db, staging)
+        self.assertEqual(7.0, db.get_record("2022-12-20 20:00").get_amount())
+        self.assertEqual([5.0, 2.0], db.get_site_amounts().iloc[0].tolist())
+
+    def test_sites_need_columnar_engine(self):
+        ds = DataService(engine="records")
+        self.assertEqual([], ds.get_sites())
+        self.assertRaises(ValueError, ds.get_site_consumption)
+        self.assertRaises(ValueError, ds.get_site_costs)
+
+    def test_summaries(self):
+        db = Database()
+        ds = DataService(database=db)
+        db.upsert_many(
+            ["2022-12-25 20:00", "2022-12-25 21:00", "2023-01-25 12:00"],
+            prices=[1.0, 2.0, 3.0],
+            amounts=[1.0, 1.0, 2.0],
+        )
+        daily = ds.get_daily_summary(start="2022-12-25", end="2022-12-25")
+        self.assertEqual([2.0], daily.consumption.tolist())
+        self.assertEqual([1.5], daily.price.tolist())
+        monthly = ds.get_monthly_summary()
+        self.assertEqual([3.0, 6.0], monthly.cost.tolist())
+
+    def test_get_missing_ranges(self):
+        db = Database()
+        db.upsert_many(
+            ["2022-12-25 20:00", "2022-12-25 21:00", "2022-12-25 23:00"],
+            prices=[1.0, 2.0, 3.0],
+            amounts=[1.0, float("nan"), 2.0],
+        )
+        ds = DataService(database=db)
+        self.assertEqual(
+            "2022-12-25T22:00:00+00:00 - 2022-12-25T23:00:00+00:00",
+            str(ds.get_missing_ranges("price")),
+        )
+        self.assertEqual(
+            "2022-12-25T21:00:00+00:00 - 2022-12-25T23:00:00+00:00",
+            str(ds.get_missing_ranges("amount")),
+        )
+
+    def test_save_and_load_binary_db(self):
+        db = Database()
+        db.add_record(Record("2022-12-25 20:00", price=1.0, amount=2.0))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.bin")
+            DataService(database=db).save_db(dbfile)
+            ds = DataService(engine="columnar")
+            ds.load_db(dbfile)
+        self.assertEqual(2.0, ds.get_record("2022-12-25 20:00").get_amount())
+
+    def test_save_and_load_compressed_db(self):
+        db = Database()
+        db.add_record(Record("2022-12-25 20:00", price=1.0, amount=2.0))
+        for extension, magic in ((".csv.gz", b"\x1f\x8b"), (".csv.xz", b"\xfd7zXZ")):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                dbfile = os.path.join(tmpdir, f"db{extension}")
+                DataService(database=db).save_db(dbfile)
+                with open(dbfile, "rb") as file:
+                    self.assertTrue(file.read().startswith(magic))
+                ds = DataService()
+                ds.load_db(dbfile)
+            self.assertEqual(2.0, ds.get_record("2022-12-25 20:00").get_amount())
+
+    def test_merge_db(self):
+        db = Database()
+        db.add_record(Record("2022-12-25 20:00", price=1.0, amount=2.0))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "edge.bin")
+            DataService(database=db).save_db(dbfile)
+            ds = DataService()
+            stats = ds.merge_db(dbfile)
+        self.assertEqual(1, stats["added"])
+        self.assertEqual(2.0, ds.get_record("2022-12-25 20:00").get_amount())
+
+    def test_save_db_with_journal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.csv")
+            db = Database()
+            ds = DataService(database=db, journal_limit=2)
+            ds.save_db(dbfile)
+            for hour in range(20, 23):
+                db.add_or_update_record(Record(f"2022-12-25 {hour}:00", price=1.0))
+                ds.save_db(dbfile)
+                journal = DataService.get_journal(dbfile)
+                self.assertEqual((hour - 19) % 3, len(journal))
+            ds = DataService()
+            ds.load_db(dbfile)
+        self.assertEqual(1.0, ds.get_record("2022-12-25 22:00").get_price())
+
+    def test_save_db_with_journal_after_clearing_merge(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.csv")
+            db = Database()
+            db.upsert_many(["2022-12-01 00:00"], prices=[1.0], amounts=[2.0])
+            ds = DataService(database=db, journal_limit=10)
+            ds.save_db(dbfile)
+            other = Database()
+            other.upsert_many(["2022-12-01 00:00"], amounts=[3.0])
+            db.merge(other, policy="prefer-right")
+            ds.save_db(dbfile)
+            ds = DataService()
+            ds.load_db(dbfile)
+        record = ds.get_record("2022-12-01 00:00")
+        self.assertFalse(record.has_price())
+        self.assertEqual(3.0, record.get_amount())
+
+    def test_sqlite_db(self):
+        db = Database()
+        db.add_record(Record("2022-12-25 20:00", price=1.0))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.sqlite")
+            DataService(database=db).save_db(dbfile)
+            ds = DataService(engine="sqlite")
+            ds.load_db(dbfile)
+            self.assertEqual(1.0, ds.get_record("2022-12-25 20:00").get_price())
+
+    def test_partitioned_db(self):
+        db = Database()
+        db.add_record(Record("2022-11-25 20:00", price=1.0))
+        db.add_record(Record("2022-12-25 20:00", price=2.0))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "db.parts")
+            DataService(database=db).save_db(dbfile)
+            ds = DataService(engine="partitioned")
+            ds.load_db(dbfile)
+            df = ds.get_data_as_dataframe(start="2022-12-01")
+        self.assertEqual([2.0], df.price.tolist())
@@ -1,9 +1,16 @@
+import os
 import tempfile
 import unittest
+import io
 import json
+import http.server
+import threading
+from entities import HttpCache
+from entities.jsonstream import iter_json
 from entities.sources import PriceSource
 from entities.sources import GenericSource
-from repositories import Database
+from entities.sources import ConsumptionSource
+from repositories import Database, ColumnarDatabase
 
 
 class TestPriceSource(unittest.TestCase):
@@ -22,6 +29,18 @@ class TestPriceSource(unittest.TestCase):
         print(db.get_records())
         self.assertEqual(1.0, db.get_record("2022-12-26 17:00:00").get_price())
 
+    def test_areas(self):
+        data = {
+            area: [{"DateTime": "2022-12-26T19:00:00+02:00", "PriceNoTax": price}]
+            for area, price in (("FI", 1.0), ("SE3", 0.5), ("EE", 2.0))
+        }
+        db = ColumnarDatabase()
+        source = PriceSource(db, data=data, areas=["FI", "SE3", "EE"])
+        self.assertEqual((3, 0), source.update())
+        self.assertEqual(["FI", "SE3", "EE"], db.get_areas())
+        prices = db.get_area_prices()
+        self.assertEqual([1.0, 0.5, 2.0], prices.iloc[0].tolist())
+
 
 class TestGenericSource(unittest.TestCase):
     def test_source(self):
@@ -35,3 +54,186 @@ class TestGenericSource(unittest.TestCase):
         source = GenericSource(db, local_file=tf.name)
         source.update()
         self.assertEqual(1.0, db.get_record("2022-12-21 22:00:00").get_price())
+
+    def test_ndjson_in_batches(self):
+        db = Database()
+        rows = [
+            {"time": f"2022-12-21 {hour}:00:00", "price": float("nan"), "amount": 1.0}
+            for hour in range(10, 15)
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "data.ndjson")
+            with open(filename, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(row) + "\n" for row in rows)
+            source = GenericSource(db, local_file=filename, batch_size=2)
+            self.assertEqual((0, 5), source.update())
+        self.assertEqual(5, len(db))
+
+
+class TestJsonStream(unittest.TestCase):
+    def test_iter_json(self):
+        rows = [
+            {"time": i, "price": float("nan"), "amount": i * 0.25} for i in range(50)
+        ]
+        text = json.dumps(rows, indent=2)
+        for chunk_size in (1, 7, 65536):
+            with self.subTest(chunk_size=chunk_size):
+                result = list(iter_json(io.StringIO(text), chunk_size=chunk_size))
+                self.assertEqual(50, len(result))
+                self.assertEqual(12.25, result[-1]["amount"])
+        self.assertEqual([], list(iter_json(io.StringIO(" [ ] "))))
+        self.assertEqual([1, 22], list(iter_json(io.StringIO("1\n22\n"), 1)))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json(io.StringIO("[1, 2")))
+
+
+class TestConsumptionSource(unittest.TestCase):
+    def test_source(self):
+        db = Database()
+        data = (
+            "Mittauspisteen tunnus;Tuotteen tyyppi;Resoluutio;Yksikkötyyppi;"
+            "Lukeman tyyppi;Alkuaika;Määrä;Laatu\n"
+            "643000000000000000;8716867000030;PT1H;kWh;BN01;"
+            "2022-12-20T22:00:00.000Z;0.35;OK\n"
+            "643000000000000000;8716867000030;PT1H;kWh;BN01;"
+            "2022-12-20T23:00:00.000Z;0.42;OK\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as tf:
+            tf.write(data)
+        source = ConsumptionSource(db, local_file=tf.name)
+        self.assertEqual((0, 2), source.update())
+        self.assertEqual(0.42, db.get_record("2022-12-20 23:00:00").get_amount())
+        os.remove(tf.name)
+
+    def test_sites(self):
+        db = ColumnarDatabase()
+        data = (
+            "Mittauspisteen tunnus;Tuotteen tyyppi;Resoluutio;Yksikkötyyppi;"
+            "Lukeman tyyppi;Alkuaika;Määrä;Laatu\n"
+            "643000000000000001;8716867000030;PT1H;kWh;BN01;"
+            "2022-12-20T22:00:00.000Z;0.35;OK\n"
+            "643000000000000002;8716867000030;PT1H;kWh;BN01;"
+            "2022-12-20T22:00:00.000Z;0.42;OK\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as tf:
+            tf.write(data)
+        source = ConsumptionSource(db, local_file=tf.name)
+        self.assertEqual((0, 2), source.update())
+        os.remove(tf.name)
+        self.assertEqual(["643000000000000001", "643000000000000002"], db.get_sites())
+        self.assertAlmostEqual(0.77, db.get_record("2022-12-20 22:00").get_amount())
+
+    def test_checkpoint(self):
+        header = (
+            "Mittauspisteen tunnus;Tuotteen tyyppi;Resoluutio;Yksikkötyyppi;"
+            "Lukeman tyyppi;Alkuaika;Määrä;Laatu\n"
+        )
+        row = "643000000000000000;8716867000030;PT1H;kWh;BN01;{};{};OK\n"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csvfile = os.path.join(tmpdir, "consumption.csv")
+            checkpoint = os.path.join(tmpdir, "consumption.csv.checkpoint")
+            with open(csvfile, "w", encoding="utf8") as file:
+                file.write(header + row.format("2022-12-20T22:00:00.000Z", 0.35))
+            db = Database()
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 1), source.update())
+            # checkpoint is used only after it has been saved
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 0), source.update())
+            self.assertEqual(1, len(db))
+            source.save_checkpoint()
+            with open(csvfile, "a", encoding="utf8") as file:
+                file.write(row.format("2022-12-20T23:00:00.000Z", 0.42))
+            db = Database()
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 1), source.update())
+            self.assertEqual(1, len(db))
+            self.assertEqual(0.42, db.get_record("2022-12-20 23:00").get_amount())
+            source.save_checkpoint()
+            # nothing new
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 0), source.update())
+            # a row being written is read when it is complete
+            with open(csvfile, "a", encoding="utf8") as file:
+                file.write(row.format("2022-12-21T00:00:00.000Z", 0.51)[:-6])
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 0), source.update())
+            source.save_checkpoint()
+            with open(csvfile, "a", encoding="utf8") as file:
+                file.write("51;OK\n")
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 1), source.update())
+            self.assertEqual(0.51, db.get_record("2022-12-21 00:00").get_amount())
+            source.save_checkpoint()
+            # prefix changed, full import
+            with open(csvfile, "w", encoding="utf8") as file:
+                file.write(header)
+                file.write(row.format("2022-12-20T22:00:00.000Z", 0.5))
+                file.write(row.format("2022-12-20T23:00:00.000Z", 0.42))
+            db = Database()
+            source = ConsumptionSource(db, csvfile, checkpoint_file=checkpoint)
+            self.assertEqual((0, 2), source.update())
+            self.assertEqual(0.5, db.get_record("2022-12-20 22:00").get_amount())
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    body = b'[{"DateTime": "2022-12-26T19:00:00+02:00", "PriceNoTax": 1.0}]'
+    requests = []
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        _Handler.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        _Handler.requests = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/prices"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_hit_miss_and_revalidation(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = HttpCache(tmpdir, ttl=3600)
+            response = cache.get(self.url)
+            self.assertFalse(response.from_cache)
+            self.assertEqual(1.0, response.json()[0]["PriceNoTax"])
+            response = cache.get(self.url)
+            self.assertTrue(response.from_cache)
+            self.assertEqual([None], _Handler.requests)
+            # other parameters are another url
+            cache.get(self.url, params={"region": "SE3"})
+            self.assertEqual([None, None], _Handler.requests)
+            cache = HttpCache(tmpdir, ttl=0)
+            response = cache.get(self.url)
+            self.assertTrue(response.from_cache)
+            self.assertEqual([None, None, '"v1"'], _Handler.requests)
+            self.assertEqual(1.0, response.json()[0]["PriceNoTax"])
+
+    def test_price_source(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = HttpCache(tmpdir, ttl=3600)
+            PriceSource.url, url = self.url, PriceSource.url
+            try:
+                for _ in range(2):
+                    db = Database()
+                    PriceSource(db, cache=cache).update()
+                    self.assertEqual(1, len(db))
+            finally:
+                PriceSource.url = url
+        self.assertEqual(1, len(_Handler.requests))
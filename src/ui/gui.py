@@ -18,9 +18,9 @@ matplotlib.use("TkAgg")
 matplotlib.rcParams["timezone"] = "Europe/Helsinki"
 
 
-def _extended(data):
+def _extended(data, resolution=3600):
     lastrow = pd.DataFrame(
-        index=[data.index[-1] + pd.Timedelta("1h")],
+        index=[data.index[-1] + pd.Timedelta(seconds=resolution)],
         data=data.tail(1).values,
         columns=data.columns,
     )
@@ -35,10 +35,18 @@ def format_date(data, _):
     return text
 
 
+def _get_recent_data(dataservice, days=5):
+    # start from a full hour, so that every tab gets the same cached export
+    now = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = now - datetime.timedelta(days=days)
+    return dataservice.get_data_as_dataframe(start=start)
+
+
 def _prepare_data(dataservice):
-    data = dataservice.get_data_as_dataframe()
+    data = _get_recent_data(dataservice)
     data = data.dropna(how="all").last("4d")
-    edata = _extended(data).tz_convert("Europe/Helsinki").fillna(0)
+    resolution = dataservice.get_resolution()
+    edata = _extended(data, resolution).tz_convert("Europe/Helsinki").fillna(0)
     edata.price *= 100
     max_price = edata.price.max()
     max_consumption = edata.amount.max()
@@ -98,10 +106,10 @@ def create_scheduling_widget(tab, dataservice):
 
 def create_analysis_widget(tab, saehaekkae):
     """Create analysis widged (tab 2)."""
-    data = saehaekkae.get_data_as_dataframe()
+    data = _get_recent_data(saehaekkae)
     figure = Figure(figsize=(18, 8), dpi=100)
     axes = figure.add_subplot()
-    data.price.tail(48).plot(kind="bar", ax=axes, picker=True)
+    data.price.last("48h").plot(kind="bar", ax=axes, picker=True)
     axes.set_title("Sähkön käyttö tunneittain")
     axes.set_ylabel("Määrä (kWh)")
     figure.autofmt_xdate(rotation=45)
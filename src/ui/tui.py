@@ -21,12 +21,14 @@ class IO:
 class TUI:
     """A simple Text User Interface"""
 
-    def __init__(self, dataservice, datetimepicker, messageservice, _io=IO):
+    def __init__(self, dataservice, datetimepicker, messageservice, _io=IO, area=None):
         self._dataservice = dataservice
         self._datetimepicker = datetimepicker
         self._messageservice = messageservice
         self._io = _io
+        self._area = area
         self._commands = {
+            "A": self.select_area,
             "V": self.pick,
             "C": self.clear,
             "G": self.calendar,
@@ -52,12 +54,16 @@ class TUI:
         return self._io
 
     @staticmethod
-    def format_list_price(record, format_date=True):
-        """Return nicely formatted line for list price."""
+    def format_list_price(record, format_date=True, resolution=3600):
+        """Return nicely formatted line for list price.
+
+        Minutes are shown if resolution (in seconds) is less than an hour.
+        """
         start = record.get_time().astimezone()
-        end = start + datetime.timedelta(hours=1)
-        hour = start.strftime("%H")
-        next_hour = end.strftime("%H")
+        end = start + datetime.timedelta(seconds=resolution)
+        layout = "%H" if resolution % 3600 == 0 else "%H:%M"
+        hour = start.strftime(layout)
+        next_hour = end.strftime(layout)
         date = start.strftime("%Y-%m-%d") if format_date else " " * 10
         price = record.get_price() * 100
         return f"{date} {hour} - {next_hour} : {price:5.2f}"
@@ -65,9 +71,10 @@ class TUI:
     def list_prices(self):
         """List all future electric prices."""
         out = self.get_io().print
+        area = f" ({self._area})" if self._area else ""
         out(
             "\n"
-            "Pörssisähkön tulevat hinnat:\n"
+            f"Pörssisähkön tulevat hinnat{area}:\n"
             "\n"
             "   ⭐   seuraavan kolmen halvimman tunnin joukossa\n"
             "   ✅   valittu tunti\n"
@@ -75,12 +82,14 @@ class TUI:
         )
         dataservice = self.get_dataservice()
         picker = self.get_datetimepicker()
-        cheap_hours = dataservice.find_cheapest_hours(hours=3)
+        cheap_hours = dataservice.find_cheapest_hours(hours=3, area=self._area)
         selected_hours = picker.to_selection()
-        for (rownum, record) in enumerate(dataservice.get_future_prices()):
+        resolution = dataservice.get_resolution()
+        records = dataservice.get_future_prices(area=self._area)
+        for (rownum, record) in enumerate(records):
             start_time = record.get_time().astimezone()
-            format_date = rownum == 0 or start_time.hour == 0
-            line = self.format_list_price(record, format_date=format_date)
+            format_date = rownum == 0 or start_time.hour == start_time.minute == 0
+            line = self.format_list_price(record, format_date, resolution)
             line += " ✅" if start_time in selected_hours else " "
             if start_time in cheap_hours:
                 line += " ⭐"
@@ -92,6 +101,7 @@ class TUI:
         out()
         out("Komennot:")
         out()
+        out("  (a) valitse hinta-alue          (esim. 'a se3')")
         out("  (v) valitse ajanjakso           (esim. 'v 2022-12-23 17-18')")
         out("  (c) poista valinnat")
         out("  (g) laita merkintä kalenteriin")
@@ -99,6 +109,15 @@ class TUI:
         out("  (q) poistu käyttöliittymästä")
         out()
 
+    def select_area(self, area):
+        """Select bidding area of the listed prices."""
+        out = self.get_io().print
+        areas = self.get_dataservice().get_areas()
+        if area not in areas:
+            out(f"Hinta-aluetta {area} ei löydy, alueet: {', '.join(areas)}")
+            return
+        self._area = area
+
     def pick(self, date, timerange):
         """Pick some time range using DateTimePicker."""
         out = self.get_io().print
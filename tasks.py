@@ -31,6 +31,12 @@ def coverage_report(ctx):
     ctx.run("coverage html", pty=True)
 
 
+@task
+def benchmark(ctx):
+    ctx.run("cd src && python3 -m benchmarks.compression", pty=True)
+    ctx.run("cd src && python3 -m benchmarks.timeparsing", pty=True)
+
+
 @task
 def lint(ctx):
     ctx.run("pylint --ignore=tests src", pty=True)